@@ -3,7 +3,10 @@
 """
 
 from typing import Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+
+import msgspec
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
 from pydantic import ValidationError
 
 from app.models.schemas import (
@@ -11,6 +14,10 @@ from app.models.schemas import (
     BubbleNoteResponse,
     ApiResponse,
     BubbleNoteListResponse,
+    BUBBLE_NOTE_CREATE_DECODER,
+    BUBBLE_ROW_ADAPTER,
+    BUBBLE_LIST_ADAPTER,
+    validate_bubble_note_struct,
 )
 from app.services.bubble_service import bubble_service
 from app.core.database import get_nearby_bubbles, get_top_bubbles
@@ -22,6 +29,27 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/bubbles", tags=["气泡笔记"])
 
 
+# 列表响应信封的固定部分（预编码，见 _bubble_list_response）
+_LIST_ENVELOPE_PREFIX = '{"code":200,"message":"查询成功","data":'.encode()
+
+
+def _bubble_list_response(rows: list) -> Response:
+    """
+    把 DB 行列表转为 BubbleNoteListResponse 形状的 JSON 响应
+
+    用共享 TypeAdapter 对全部行做单次原生校验，再由 dump_json 直接
+    产出 bytes 拼进预编码信封，跳过逐行模型构造和 response_model
+    的二次校验/序列化。
+    """
+    validated = BUBBLE_LIST_ADAPTER.validate_python(rows)
+    body = (
+        _LIST_ENVELOPE_PREFIX
+        + BUBBLE_LIST_ADAPTER.dump_json(validated)
+        + f',"total":{len(validated)}}}'.encode()
+    )
+    return Response(content=body, media_type="application/json")
+
+
 # ========================================
 # 核心 API: 创建/更新气泡笔记
 # ========================================
@@ -32,10 +60,25 @@ router = APIRouter(prefix="/bubbles", tags=["气泡笔记"])
     summary="创建或更新气泡笔记 (纯文本)",
     description="使用 JSON 格式创建或更新气泡笔记,不含图片"
 )
-async def create_or_update_bubble_note_json(note_data: BubbleNoteCreate):
+async def create_or_update_bubble_note_json(request: Request):
     """创建或更新气泡笔记 (JSON 格式, 不含图片)"""
 
     try:
+        # 热路径: 请求体用 msgspec 直接解码（绕过 Pydantic 绑定，C 层校验）
+        raw_body = await request.body()
+        try:
+            note_data = BUBBLE_NOTE_CREATE_DECODER.decode(raw_body)
+            validate_bubble_note_struct(note_data)
+        except msgspec.DecodeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "code": 400,
+                    "message": "请求参数不合法",
+                    "detail": str(e)
+                }
+            )
+
         # 调用服务层处理
         result = await bubble_service.create_or_update_note(note_data)
 
@@ -50,16 +93,8 @@ async def create_or_update_bubble_note_json(note_data: BubbleNoteCreate):
             }
         )
 
-    except ValidationError as e:
-        logger.error(f"参数校验失败: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail={
-                "code": 400,
-                "message": "请求参数不合法",
-                "detail": str(e)
-            }
-        )
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"业务校验失败: {e}")
         raise HTTPException(
@@ -211,12 +246,7 @@ async def get_nearby_bubbles_api(
             status=status
         )
 
-        return BubbleNoteListResponse(
-            code=200,
-            message="查询成功",
-            data=bubbles,
-            total=len(bubbles)
-        )
+        return _bubble_list_response(bubbles)
 
     except ValueError as e:
         logger.error(f"参数校验失败: {e}")
@@ -240,6 +270,77 @@ async def get_nearby_bubbles_api(
         )
 
 
+@router.get(
+    "/nearby/stream",
+    summary="流式获取附近的气泡笔记 (NDJSON)",
+    description="""
+    以换行分隔 JSON (NDJSON) 流式返回附近气泡, 每行一条记录
+
+    适用于 limit 较大的查询: 逐行序列化发送, 峰值内存按单行计,
+    客户端收到首行即可开始渲染。参数与 /nearby 一致。
+    """
+)
+async def get_nearby_bubbles_stream_api(
+    longitude: float,
+    latitude: float,
+    radius_km: float = 1.0,
+    limit: int = 20,
+    status: Optional[int] = None
+):
+    """流式获取附近的气泡笔记 (NDJSON, 每行一条)"""
+
+    try:
+        # 参数校验 (与批量路由保持一致)
+        if not -180 <= longitude <= 180:
+            raise ValueError("经度必须在 [-180, 180] 范围内")
+        if not -90 <= latitude <= 90:
+            raise ValueError("纬度必须在 [-90, 90] 范围内")
+        if radius_km <= 0 or radius_km > 100:
+            raise ValueError("半径必须在 (0, 100] 公里范围内")
+        if limit <= 0 or limit > 100:
+            raise ValueError("返回数量必须在 (0, 100] 范围内")
+
+        bubbles = await get_nearby_bubbles(
+            longitude=longitude,
+            latitude=latitude,
+            radius_km=radius_km,
+            limit=limit,
+            status=status
+        )
+
+        async def gen():
+            # 逐行校验 + 序列化: 同一时刻只有一行 JSON bytes 驻留内存,
+            # 避免批量路由里整表 dump 的峰值占用
+            for row in bubbles:
+                yield BUBBLE_ROW_ADAPTER.dump_json(
+                    BUBBLE_ROW_ADAPTER.validate_python(row)
+                ) + b"\n"
+
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+    except ValueError as e:
+        logger.error(f"参数校验失败: {e}")
+        # 查询参数 status 遮蔽了 fastapi.status, 这里用字面量状态码
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": 400,
+                "message": str(e),
+                "detail": None
+            }
+        )
+    except Exception as e:
+        logger.error(f"查询失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "code": 500,
+                "message": "服务器内部错误",
+                "detail": str(e)
+            }
+        )
+
+
 # ========================================
 # 查询 API: 获取 Top 气泡
 # ========================================
@@ -268,12 +369,7 @@ async def get_top_bubbles_api(
 
         bubbles = await get_top_bubbles(limit=limit, user_id=user_id)
 
-        return BubbleNoteListResponse(
-            code=200,
-            message="查询成功",
-            data=bubbles,
-            total=len(bubbles)
-        )
+        return _bubble_list_response(bubbles)
 
     except ValueError as e:
         logger.error(f"参数校验失败: {e}")
@@ -6,38 +6,148 @@
 更新时间：2025-01-17（新增会话结束接口）
 """
 
+import asyncio
+import inspect
 import logging
-import json
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+import msgpack
+import orjson
+from collections import OrderedDict
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 from typing import Optional
 from pydantic import BaseModel, Field
 from app.models.schemas import (
     GeniusLociChatRequest,
     GeniusLociChatResponse,
     ApiResponse,
-    GetAISummaryRequest,
-    AISummaryResponse
+    GetAISummaryRequest
 )
 from app.services.genius_loci_service import (
     genius_loci_chat_stream,
     session_manager,
-    archive_conversation
+    archive_conversation,
+    SESSION_ID_KEY
 )
 from app.core.database import get_ai_summary_by_bubble_id
 
 logger = logging.getLogger(__name__)
 
-# 创建路由器
-router = APIRouter(prefix="/genius-loci", tags=["地灵对话"])
+# 流式生成器必须是 async def：同步生成器会被 Starlette 丢进线程池迭代，
+# 每个 chunk 一次线程切换，实测会慢约 60 倍（秒级 vs 百毫秒级）
+assert inspect.isasyncgenfunction(genius_loci_chat_stream), \
+    "genius_loci_chat_stream 必须是 async 生成器，否则 SSE 流会退化为线程池迭代"
+
+# SSE 保活间隔（秒），防止 Nginx/CDN 在长时间 LLM 生成期间断开空闲连接
+SSE_PING_INTERVAL = 15
+
+# 生产/写出解耦队列上限：LLM 快于客户端时最多缓冲 32 个 chunk，
+# 超出后生产端自然阻塞（背压），避免慢客户端把整段回复堆在内存里
+STREAM_QUEUE_MAX = 32
+
+# 队列结束哨兵
+_STREAM_DONE = object()
+
+# 结束帧内容固定，模块导入时序列化一次
+END_EVENT_DATA = orjson.dumps({"type": "end", "code": 200}).decode()
+
+# msgpack 流式协议（移动端弱网优化）：
+# 客户端发送 Accept: application/x-msgpack-stream 时，按 msgpack 二进制帧
+# 而非 SSE 文本帧下发，字段名缩短为单字符（t=类型, c=内容, s=会话, m=消息），
+# 每个 token 的线上开销约为 SSE+JSON 的一半
+MSGPACK_STREAM_MEDIA_TYPE = "application/x-msgpack-stream"
+MSGPACK_END_FRAME = msgpack.packb({"t": "e"})
+
+# 健康检查响应固定不变，连 Response 对象也只构建一次
+# （k8s 存活探针每秒打一次该接口，复用单例后每次探测零分配）
+HEALTH_BODY = orjson.dumps({
+    "code": 200,
+    "message": "地灵对话服务运行正常",
+    "data": {
+        "service": "genius-loci-chat",
+        "status": "active"
+    }
+})
+_HEALTH_RESPONSE = Response(content=HEALTH_BODY, media_type="application/json")
+
+
+def _static_json_response(payload: dict) -> Response:
+    """为内容固定的响应预构建 Response 单例（跳过 jsonable_encoder 和重复序列化）"""
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+
+# 会话接口的未命中分支内容固定（过期 session_id 的未命中率不低），
+# 预构建单例；HTTP 状态保持 200，错误码由 body 中的 code 表达（与现有约定一致）
+_SESSION_404 = _static_json_response({
+    "code": 404,
+    "message": "会话不存在或已结束",
+    "data": None
+})
+_SESSION_403 = _static_json_response({
+    "code": 403,
+    "message": "无权结束该会话",
+    "data": None
+})
+_SESSION_STATUS_404 = _static_json_response({
+    "code": 404,
+    "message": "会话不存在",
+    "data": None
+})
+
+# 创建路由器（默认使用 orjson 序列化响应，比标准库 json 快 3-10 倍）
+router = APIRouter(
+    prefix="/genius-loci",
+    tags=["地灵对话"],
+    default_response_class=ORJSONResponse
+)
 
 
 # ========================================
 # 流式对话端点
 # ========================================
 
+async def _stream_chunks(request: GeniusLociChatRequest):
+    """
+    经由有界队列解耦 LLM 生产与网络写出
+
+    生产任务独立消费 genius_loci_chat_stream，消费端（SSE/msgpack 框架层）
+    从队列取块写 socket。两者重叠执行：客户端短暂变慢不会立刻卡住 LLM
+    迭代器，队列满（STREAM_QUEUE_MAX）时生产端才阻塞形成背压。
+    生产端异常经队列传递，在消费端重新抛出。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_MAX)
+
+    async def produce():
+        try:
+            async for chunk in genius_loci_chat_stream(
+                user_id=request.user_id,
+                message=request.message,
+                gps_longitude=request.gps_longitude,
+                gps_latitude=request.gps_latitude,
+                session_id=request.session_id,
+                image_url=request.image_url
+            ):
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_STREAM_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _STREAM_DONE:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # 客户端断连时终止生产任务，避免 LLM 流继续产出到无人消费的队列
+        producer.cancel()
+
+
 @router.post("/chat", response_model=GeniusLociChatResponse)
-async def chat_with_genius_loci(request: GeniusLociChatRequest):
+async def chat_with_genius_loci(request: GeniusLociChatRequest, http_request: Request):
     """
     地灵流式对话接口
 
@@ -60,7 +170,7 @@ async def chat_with_genius_loci(request: GeniusLociChatRequest):
         request: 对话请求
 
     Returns:
-        StreamingResponse: SSE 流式响应
+        EventSourceResponse: SSE 流式响应（带保活 ping）
 
     请求示例：
     ```json
@@ -82,54 +192,53 @@ async def chat_with_genius_loci(request: GeniusLociChatRequest):
             f"session_id={request.session_id}"
         )
 
+        # msgpack 二进制流（客户端显式协商时启用，EventSource 浏览器客户端走 SSE）
+        if http_request.headers.get("accept") == MSGPACK_STREAM_MEDIA_TYPE:
+            async def generate_msgpack():
+                """生成 msgpack 二进制帧流"""
+                try:
+                    async for chunk in _stream_chunks(request):
+                        if isinstance(chunk, dict):
+                            yield msgpack.packb({"t": "m", "s": chunk[SESSION_ID_KEY]})
+                            continue
+                        yield msgpack.packb({"t": "c", "c": chunk})
+
+                    yield MSGPACK_END_FRAME
+
+                except Exception as e:
+                    logger.error(f"msgpack 流式生成异常: {e}")
+                    yield msgpack.packb({"t": "err", "m": str(e)})
+
+            return StreamingResponse(
+                generate_msgpack(),
+                media_type=MSGPACK_STREAM_MEDIA_TYPE
+            )
+
         # 生成流式响应
         async def generate():
             """生成 SSE 流式响应"""
-            actual_session_id = None
-            first_chunk = True
-
             try:
-                # 调用核心服务
-                async for chunk in genius_loci_chat_stream(
-                    user_id=request.user_id,
-                    message=request.message,
-                    gps_longitude=request.gps_longitude,
-                    gps_latitude=request.gps_latitude,
-                    session_id=request.session_id,
-                    image_url=request.image_url
-                ):
-                    # 首次发送时包含 session_id
-                    if first_chunk:
-                        # 查找当前用户的会话（可能是新创建的）
-                        for sid, sess in session_manager.sessions.items():
-                            if sess["user_id"] == request.user_id:
-                                actual_session_id = sid
-                                break
-
-                        if actual_session_id:
-                            # 构建包含 session_id 的元数据
-                            metadata = {
-                                "type": "metadata",
-                                "session_id": actual_session_id,
-                                "code": 200
-                            }
-                            # 发送元数据
-                            yield f"data: {json.dumps(metadata, ensure_ascii=False)}\n\n"
-                            first_chunk = False
+                # 调用核心服务（生产与写出经有界队列解耦）
+                async for chunk in _stream_chunks(request):
+                    # 首个产出为会话元数据哨兵，直接取 session_id（O(1)）
+                    if isinstance(chunk, dict):
+                        metadata = {
+                            "type": "metadata",
+                            "session_id": chunk[SESSION_ID_KEY],
+                            "code": 200
+                        }
+                        yield ServerSentEvent(data=orjson.dumps(metadata).decode())
+                        continue
 
                     # 发送文本块
                     data = {
                         "type": "content",
                         "content": chunk
                     }
-                    yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    yield ServerSentEvent(data=orjson.dumps(data).decode())
 
-                # 发送结束标志
-                end_data = {
-                    "type": "end",
-                    "code": 200
-                }
-                yield f"data: {json.dumps(end_data, ensure_ascii=False)}\n\n"
+                # 发送结束标志（预编码常量）
+                yield ServerSentEvent(data=END_EVENT_DATA)
 
             except Exception as e:
                 logger.error(f"流式生成异常: {e}")
@@ -139,17 +248,10 @@ async def chat_with_genius_loci(request: GeniusLociChatRequest):
                     "code": 500,
                     "message": str(e)
                 }
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
-
-        return StreamingResponse(
-            generate(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
-        )
+                yield ServerSentEvent(data=orjson.dumps(error_data).decode())
+
+        # EventSourceResponse 自动设置 SSE 头并定期发送保活 ping
+        return EventSourceResponse(generate(), ping=SSE_PING_INTERVAL)
 
     except Exception as e:
         logger.error(f"地灵对话接口异常: {e}")
@@ -162,15 +264,8 @@ async def chat_with_genius_loci(request: GeniusLociChatRequest):
 
 @router.get("/health")
 async def health_check():
-    """健康检查接口"""
-    return {
-        "code": 200,
-        "message": "地灵对话服务运行正常",
-        "data": {
-            "service": "genius-loci-chat",
-            "status": "active"
-        }
-    }
+    """健康检查接口（返回预构建的单例响应）"""
+    return _HEALTH_RESPONSE
 
 
 # ========================================
@@ -192,7 +287,7 @@ class EndSessionRequest(BaseModel):
 
 
 @router.post("/end-session")
-async def end_session(request: EndSessionRequest):
+async def end_session(request: EndSessionRequest, background_tasks: BackgroundTasks):
     """
     结束会话接口（用户主动触发）
 
@@ -248,37 +343,35 @@ async def end_session(request: EndSessionRequest):
         session = session_manager.get_session(session_id)
         if not session:
             logger.warning(f"会话不存在或已结束: session_id={session_id}")
-            return {
-                "code": 404,
-                "message": "会话不存在或已结束",
-                "data": None
-            }
+            return _SESSION_404
 
         # 验证用户 ID
-        if session["user_id"] != user_id:
+        if session.user_id != user_id:
             logger.warning(f"用户ID不匹配: session_id={session_id}")
-            return {
-                "code": 403,
-                "message": "无权结束该会话",
-                "data": None
-            }
-
-        # 获取归档所需数据
-        bubble_id = session.get("bubble_id")
-        conversation = session.get("history", [])
-        gps_longitude = session["location"]["longitude"]
-        gps_latitude = session["location"]["latitude"]
-
-        # 异步归档对话
+            return _SESSION_403
+
+        # 获取归档所需数据（一次性解包，避免重复字典访问）
+        bubble_id = session.bubble_id
+        # history 为 deque，转 list 快照：会话随后即被清除，归档任务用副本
+        conversation = list(session.history)
+        # 摘要折叠后 history 只保留近期片段，总轮数以累计计数器为准
+        conversation_turns = session.conversation_turns
+        gps_longitude = session.gps_longitude
+        gps_latitude = session.gps_latitude
+
+        # 异步归档对话（后台任务执行，不阻塞响应——sendBeacon 等调用方不需要归档结果）
         if conversation and bubble_id:
-            logger.info(f"开始归档会话: session_id={session_id}, bubble_id={bubble_id}, 对话轮数={len(conversation)//2}")
-            await archive_conversation(
+            logger.info(f"提交后台归档任务: session_id={session_id}, bubble_id={bubble_id}, 对话轮数={conversation_turns}")
+            background_tasks.add_task(
+                archive_conversation,
                 bubble_id=bubble_id,
                 user_id=user_id,
                 session_id=session_id,
                 conversation=conversation,
                 gps_longitude=gps_longitude,
-                gps_latitude=gps_latitude
+                gps_latitude=gps_latitude,
+                summary_so_far=session.summary,
+                prior_turns=session.summary_turns
             )
         else:
             if not conversation:
@@ -296,7 +389,7 @@ async def end_session(request: EndSessionRequest):
             "message": "会话已成功结束",
             "data": {
                 "session_id": session_id,
-                "conversation_turns": len(conversation) // 2 if conversation else 0,
+                "conversation_turns": conversation_turns,
                 "archived": bool(conversation and bubble_id)
             }
         }
@@ -325,22 +418,21 @@ async def get_session_status(session_id: str):
         session = session_manager.get_session(session_id)
 
         if not session:
-            return {
-                "code": 404,
-                "message": "会话不存在",
-                "data": None
-            }
+            return _SESSION_STATUS_404
 
         return {
             "code": 200,
             "message": "会话存在",
             "data": {
                 "session_id": session_id,
-                "user_id": session.get("user_id"),
-                "bubble_id": session.get("bubble_id"),
-                "conversation_turns": session.get("conversation_turns", 0),
-                "is_first": session.get("is_first", False),
-                "location": session.get("location"),
+                "user_id": session.user_id,
+                "bubble_id": session.bubble_id,
+                "conversation_turns": session.conversation_turns,
+                "is_first": session.is_first,
+                "location": {
+                    "longitude": session.gps_longitude,
+                    "latitude": session.gps_latitude
+                },
                 "auto_archive_threshold": 100  # 提示前端自动归档阈值
             }
         }
@@ -354,7 +446,39 @@ async def get_session_status(session_id: str):
 # AI 总结查询端点
 # ========================================
 
-@router.post("/ai-summary", response_model=AISummaryResponse)
+# ai_result 一旦归档即不可变，按 (record_id, 长度, 前缀) 做 LRU 缓存，
+# 避免客户端 202->200 轮询期间反复解析大段总结文本。
+# key 用长度+前 16 字符做指纹，避免把完整原文再存一份。
+_AI_RESULT_CACHE_MAX = 4096
+_ai_result_cache: OrderedDict = OrderedDict()
+
+
+def _parse_ai_result(record_id, ai_result: str):
+    """解析 ai_result 字段（JSON 格式），带 LRU 缓存"""
+    key = (record_id, len(ai_result), ai_result[:16])
+    cached = _ai_result_cache.get(key)
+    if cached is not None:
+        _ai_result_cache.move_to_end(key)
+        return cached
+
+    # 先做一次廉价嗅探：纯文本总结直接走 raw 分支，省掉抛异常的慢路径
+    if ai_result.lstrip()[:1] in ("{", "["):
+        try:
+            parsed = orjson.loads(ai_result)
+        except orjson.JSONDecodeError:
+            # 形似 JSON 但解析失败，按纯文本处理
+            parsed = {"raw": ai_result}
+    else:
+        # 不是 JSON 格式，直接返回字符串
+        parsed = {"raw": ai_result}
+
+    _ai_result_cache[key] = parsed
+    if len(_ai_result_cache) > _AI_RESULT_CACHE_MAX:
+        _ai_result_cache.popitem(last=False)
+
+    return parsed
+
+@router.post("/ai-summary")
 async def get_ai_summary(request: GetAISummaryRequest):
     """
     获取笔记的 AI 总结
@@ -419,51 +543,46 @@ async def get_ai_summary(request: GetAISummaryRequest):
         )
 
         if not record:
-            # 未找到记录
-            return AISummaryResponse(
-                code=404,
-                message="未找到 AI 总结记录，该笔记可能尚未归档",
-                data={
+            # 未找到记录（直接构造 Response，跳过 jsonable_encoder）
+            return ORJSONResponse({
+                "code": 404,
+                "message": "未找到 AI 总结记录，该笔记可能尚未归档",
+                "data": {
                     "note_id": request.note_id,
                     "hint": "请先结束会话以触发 AI 总结"
                 }
-            )
+            })
 
         # 检查 ai_result 是否为空
         ai_result = record.get("ai_result")
 
         if not ai_result or not ai_result.strip():
             # AI 总结正在生成中
-            return AISummaryResponse(
-                code=202,
-                message="AI 总结正在生成中，请稍后查询",
-                data={
+            return ORJSONResponse({
+                "code": 202,
+                "message": "AI 总结正在生成中，请稍后查询",
+                "data": {
                     "note_id": request.note_id,
                     "status": "processing",
                     "record_id": record.get("id")
                 }
-            )
+            })
 
-        # 解析 ai_result（应该是 JSON 格式）
-        try:
-            import json
-            ai_result_json = json.loads(ai_result)
-        except:
-            # 如果不是 JSON 格式，直接返回字符串
-            ai_result_json = {"raw": ai_result}
+        # 解析 ai_result（应该是 JSON 格式，命中缓存时跳过解析）
+        ai_result_json = _parse_ai_result(record.get("id"), ai_result)
 
         # 成功返回
-        return AISummaryResponse(
-            code=200,
-            message="success",
-            data={
+        return ORJSONResponse({
+            "code": 200,
+            "message": "success",
+            "data": {
                 "note_id": request.note_id,
                 "ai_result": ai_result_json,
                 "process_time": record.get("process_time"),
                 "model_version": record.get("model_version"),
                 "record_id": record.get("id")
             }
-        )
+        })
 
     except Exception as e:
         logger.error(f"查询 AI 总结异常: {e}")
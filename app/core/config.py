@@ -17,6 +17,10 @@ class Settings:
     # 服务器配置
     HOST: str = "0.0.0.0"
     PORT: int = int(os.getenv("PORT", "8000"))
+    WORKERS: int = int(os.getenv("WORKERS", "1"))  # 建议与 CPU 核数一致
+    # 长连接 SSE 流的保活超时（秒）与单进程并发上限（防止 FD 耗尽）
+    TIMEOUT_KEEP_ALIVE: int = int(os.getenv("TIMEOUT_KEEP_ALIVE", "75"))
+    LIMIT_CONCURRENCY: int = int(os.getenv("LIMIT_CONCURRENCY", "1000"))
 
     # CORS 配置
     ALLOWED_ORIGINS: list = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -4,9 +4,15 @@ Supabase 数据库连接
 
 from typing import Optional, List, Dict, Any
 from supabase import create_client, Client
+import httpx
 import logging
+import orjson
+import math
+import random
+import time
 
 from app.core.config import settings
+from app.utils import geohash
 
 logger = logging.getLogger(__name__)
 
@@ -37,9 +43,36 @@ class Database:
         )
 
         # 创建管理员客户端 (使用 service_role key, 绕过 RLS)
+        admin_key = settings.SUPABASE_SERVICE_ROLE_KEY if settings.SUPABASE_SERVICE_ROLE_KEY else settings.SUPABASE_KEY
         self.admin_client: Client = create_client(
             settings.SUPABASE_URL,
-            settings.SUPABASE_SERVICE_ROLE_KEY if settings.SUPABASE_SERVICE_ROLE_KEY else settings.SUPABASE_KEY
+            admin_key
+        )
+
+        # 创建进程级共享的异步 PostgREST 客户端（连接池 + HTTP/2 keep-alive）
+        # supabase-py 的同步客户端每次调用都在事件循环内发同步请求，会阻塞整个循环；
+        # 热路径的查询/写入改走这两个 httpx.AsyncClient，连接在进程内复用
+        rest_base = f"{settings.SUPABASE_URL}/rest/v1"
+        limits = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+        self.rest_client: httpx.AsyncClient = httpx.AsyncClient(
+            base_url=rest_base,
+            headers={
+                "apikey": settings.SUPABASE_KEY,
+                "Authorization": f"Bearer {settings.SUPABASE_KEY}"
+            },
+            http2=True,
+            limits=limits,
+            timeout=10.0
+        )
+        self.admin_rest_client: httpx.AsyncClient = httpx.AsyncClient(
+            base_url=rest_base,
+            headers={
+                "apikey": admin_key,
+                "Authorization": f"Bearer {admin_key}"
+            },
+            http2=True,
+            limits=limits,
+            timeout=10.0
         )
 
         Database._initialized = True
@@ -57,6 +90,23 @@ class Database:
         """
         return self.admin_client if use_admin else self.client
 
+    def get_rest_client(self, use_admin: bool = False) -> httpx.AsyncClient:
+        """
+        获取异步 PostgREST 客户端 (进程级共享连接池)
+
+        Args:
+            use_admin: 是否使用管理员客户端 (绕过 RLS)
+
+        Returns:
+            httpx.AsyncClient 实例
+        """
+        return self.admin_rest_client if use_admin else self.rest_client
+
+    async def close(self):
+        """关闭异步客户端连接池（应用关闭时调用）"""
+        await self.rest_client.aclose()
+        await self.admin_rest_client.aclose()
+
 
 # 全局数据库实例
 db = Database()
@@ -91,9 +141,10 @@ async def create_bubble_note(data: Dict[str, Any]) -> Dict[str, Any]:
             "emotion": data.get("emotion", "未知"),
         }).execute()
 
-        if response.data:
-            logger.info(f"成功创建气泡笔记, id={response.data[0]['id']}")
-            return response.data[0]
+        data = response.data
+        if data:
+            logger.info(f"成功创建气泡笔记, id={data[0]['id']}")
+            return data[0]
         else:
             raise Exception("创建笔记失败: 无返回数据")
 
@@ -118,13 +169,13 @@ async def update_bubble_note(note_id: int, user_id: int, data: Dict[str, Any]) -
         client = db.get_client(use_admin=True)
 
         # 先检查笔记是否存在且属于该用户
-        check_response = client.table("bubble_note").select("*").eq("id", note_id).execute()
+        check_data = client.table("bubble_note").select("*").eq("id", note_id).execute().data
 
-        if not check_response.data:
+        if not check_data:
             logger.warning(f"笔记不存在, id={note_id}")
             return None
 
-        existing_note = check_response.data[0]
+        existing_note = check_data[0]
         if existing_note["user_id"] != user_id:
             logger.warning(f"用户无权限修改该笔记, user_id={user_id}, note_id={note_id}")
             return None
@@ -149,9 +200,10 @@ async def update_bubble_note(note_id: int, user_id: int, data: Dict[str, Any]) -
         # 执行更新
         response = client.table("bubble_note").update(update_data).eq("id", note_id).execute()
 
-        if response.data:
+        data = response.data
+        if data:
             logger.info(f"成功更新气泡笔记, id={note_id}")
-            return response.data[0]
+            return data[0]
         else:
             return None
 
@@ -174,8 +226,9 @@ async def get_bubble_note_by_id(note_id: int) -> Optional[Dict[str, Any]]:
         client = db.get_client()
         response = client.table("bubble_note").select("*").eq("id", note_id).execute()
 
-        if response.data:
-            return response.data[0]
+        data = response.data
+        if data:
+            return data[0]
         return None
 
     except Exception as e:
@@ -239,46 +292,72 @@ async def get_nearby_bubbles(
             }
         ).execute()
 
-        if response.data:
-            return response.data
-        return []
+        return response.data or []
 
     except Exception as e:
         logger.error(f"获取附近气泡失败: {e}")
-        # 如果 RPC 不可用,回退到普通查询 (不含距离)
-        return await _get_nearby_bubbles_fallback(longitude, latitude, limit, status)
+        # 如果 RPC 不可用,回退到包围盒+haversine 两段式查询
+        return await _get_nearby_bubbles_fallback(longitude, latitude, radius_km, limit, status)
+
+
+def _bbox(latitude: float, longitude: float, radius_km: float) -> tuple:
+    """
+    由中心点与半径计算经纬度包围盒（粗筛条件）
+
+    包围盒比较可走复合索引:
+    CREATE INDEX ON bubble_note (gps_latitude, gps_longitude)
+    """
+    delta_lat = radius_km / 111.0
+    # 纬度越高，1 度经度的实际距离越短（高纬/极点处钳制避免除零）
+    delta_lon = radius_km / (111.0 * max(math.cos(math.radians(latitude)), 1e-6))
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """计算两点间的大圆距离（公里）"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
 
 
 async def _get_nearby_bubbles_fallback(
     longitude: float,
     latitude: float,
+    radius_km: float = 1.0,
     limit: int = 20,
     status: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
-    获取附近气泡的降级方案 (不使用 PostGIS, 简单的边界框查询)
+    获取附近气泡的降级方案 (不使用 PostGIS)
+
+    粗筛/细筛两段式：先用包围盒条件让 DB 只返回半径附近的候选行
+    （可走 lat/lon 索引），再对候选行做精确 haversine 剔除包围盒
+    四角的误报，三角函数只在小候选集上执行。
 
     Args:
         longitude: 经度
         latitude: 纬度
+        radius_km: 搜索半径 (公里)
         limit: 返回数量限制
         status: 状态筛选
 
     Returns:
-        附近的笔记列表
+        附近的笔记列表（带 distance_meters 字段）
     """
     try:
         client = db.get_client()
 
-        # 计算边界框 (约1公里)
-        delta_lon = 0.01  # 约1公里
-        delta_lat = 0.01
+        # 粗筛: 按半径计算包围盒
+        lat_min, lat_max, lon_min, lon_max = _bbox(latitude, longitude, radius_km)
 
         query = client.table("bubble_note").select("*")
-        query = query.gte("gps_longitude", longitude - delta_lon)
-        query = query.lte("gps_longitude", longitude + delta_lon)
-        query = query.gte("gps_latitude", latitude - delta_lat)
-        query = query.lte("gps_latitude", latitude + delta_lat)
+        query = query.gte("gps_longitude", lon_min)
+        query = query.lte("gps_longitude", lon_max)
+        query = query.gte("gps_latitude", lat_min)
+        query = query.lte("gps_latitude", lat_max)
         query = query.eq("is_valid", 1)
 
         if status is not None:
@@ -287,9 +366,19 @@ async def _get_nearby_bubbles_fallback(
         query = query.order("weight_score", desc=True).limit(limit)
         response = query.execute()
 
-        if response.data:
-            return response.data
-        return []
+        rows = response.data or []
+
+        # 细筛: 精确距离校验，剔除包围盒角部在半径外的行
+        results = []
+        for row in rows:
+            distance_km = _haversine_km(
+                latitude, longitude,
+                row["gps_latitude"], row["gps_longitude"]
+            )
+            if distance_km <= radius_km:
+                row["distance_meters"] = round(distance_km * 1000, 1)
+                results.append(row)
+        return results
 
     except Exception as e:
         logger.error(f"降级查询失败: {e}")
@@ -320,9 +409,7 @@ async def get_top_bubbles(limit: int = 20, user_id: Optional[int] = None) -> Lis
         query = query.order("weight_score", desc=True).limit(limit)
         response = query.execute()
 
-        if response.data:
-            return response.data
-        return []
+        return response.data or []
 
     except Exception as e:
         logger.error(f"获取 Top 气泡失败: {e}")
@@ -344,12 +431,12 @@ async def delete_bubble_note(note_id: int, user_id: int) -> bool:
         client = db.get_client(use_admin=True)
 
         # 先检查权限
-        check_response = client.table("bubble_note").select("*").eq("id", note_id).execute()
+        check_data = client.table("bubble_note").select("*").eq("id", note_id).execute().data
 
-        if not check_response.data:
+        if not check_data:
             return False
 
-        existing_note = check_response.data[0]
+        existing_note = check_data[0]
         if existing_note["user_id"] != user_id:
             return False
 
@@ -370,11 +457,124 @@ async def delete_bubble_note(note_id: int, user_id: int) -> bool:
 # 地灵 AI 处理结果记录相关函数
 # ========================================
 
+# genius_loci_record.geohash 列的存储精度（7 位约 153m x 153m）
+# 需要 btree 索引支持前缀查询: CREATE INDEX ON genius_loci_record (geohash text_pattern_ops)
+GEOHASH_PRECISION = 7
+
+# 各精度 geohash 单元格的近似最小边长（km），用于按查询半径选择前缀长度。
+# 偶数精度的单元格是 2:1 的长方形（如精度 6 为 1.22km x 0.61km），
+# 必须按短边取值，否则 3x3 邻域在短边方向覆盖不足、边界记录被漏掉
+_GEOHASH_CELL_KM = {4: 19.5, 5: 4.9, 6: 0.61, 7: 0.153}
+
+
+def _geohash_precision_for_radius(radius_km: float) -> int:
+    """
+    选择单元格最小边长不小于查询半径的最细 geohash 精度（3x3 邻域即可覆盖半径）
+
+    上限钳在 GEOHASH_PRECISION：存量行只写到 7 位，更长的前缀永远
+    匹配不到任何记录，极小半径下会变成静默空结果
+    """
+    for precision in (7, 6, 5, 4):
+        if _GEOHASH_CELL_KM[precision] >= radius_km:
+            return precision
+    return 4
+
+
+def build_genius_loci_row(
+    bubble_id: int,
+    user_id: int,
+    ai_process_type: int,
+    ai_result: Any,
+    model_version: str = "Qwen2.5-7B",
+    expire_time: Optional[str] = None,
+    gps_longitude: Optional[float] = None,
+    gps_latitude: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    构建 genius_loci_record 表的插入行（供单条插入和批量插入共用）
+
+    Args:
+        同 create_genius_loci_record
+
+    ai_result 可直接传 dict/list：在此（DB 边界）经 orjson 一次性
+    序列化为字符串（列为 TEXT），调用方不必各自 dumps。
+
+    Returns:
+        可直接传给 insert 的行字典
+    """
+    if isinstance(ai_result, (dict, list)):
+        ai_result = orjson.dumps(ai_result).decode()
+
+    row = {
+        "bubble_id": bubble_id,
+        "user_id": user_id,
+        "ai_process_type": ai_process_type,
+        "ai_result": ai_result,
+        "model_version": model_version,
+        "is_effective": 1
+    }
+
+    if expire_time:
+        row["expire_time"] = expire_time
+
+    # 添加经纬度信息（如果提供），并冗余一列 geohash 用于前缀索引查询
+    if gps_longitude is not None:
+        row["gps_longitude"] = gps_longitude
+    if gps_latitude is not None:
+        row["gps_latitude"] = gps_latitude
+    if gps_longitude is not None and gps_latitude is not None:
+        row["geohash"] = geohash.encode(gps_latitude, gps_longitude, GEOHASH_PRECISION)
+
+    return row
+
+
+async def create_genius_loci_records_batch(
+    rows: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    批量创建地灵 AI 处理结果记录（一次 RPC 插入多行）
+
+    Args:
+        rows: build_genius_loci_row 构建的行列表
+
+    Returns:
+        插入成功的记录列表，失败则返回空列表
+    """
+    if not rows:
+        return []
+
+    try:
+        client = db.get_rest_client(use_admin=True)
+
+        response = await client.post(
+            "/genius_loci_record",
+            json=rows,
+            headers={"Prefer": "return=representation"}
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        if data:
+            logger.info(f"成功批量创建地灵AI记录: {len(data)} 条")
+            for row in data:
+                if row.get("bubble_id") is not None:
+                    invalidate_ai_summary_cache(row["bubble_id"])
+                if row.get("gps_longitude") is not None and row.get("gps_latitude") is not None:
+                    invalidate_nearby_memory_cache(row["gps_longitude"], row["gps_latitude"])
+            return data
+        else:
+            raise Exception("批量创建记录失败: 无返回数据")
+
+    except Exception as e:
+        logger.error(f"批量创建地灵AI记录失败: {e}")
+        return []
+
+
 async def create_genius_loci_record(
     bubble_id: int,
     user_id: int,
     ai_process_type: int,
-    ai_result: str,
+    ai_result: Any,
     model_version: str = "Qwen2.5-7B",
     expire_time: Optional[str] = None,
     gps_longitude: Optional[float] = None,
@@ -387,7 +587,7 @@ async def create_genius_loci_record(
         bubble_id: 关联的气泡 ID
         user_id: 用户 ID
         ai_process_type: AI 处理类型（1-分类/2-关键词/3-推荐/4-合规/5-对话总结）
-        ai_result: AI 处理结果（JSON 字符串）
+        ai_result: AI 处理结果（dict 或 JSON 字符串，dict 在行构建时统一序列化）
         model_version: 模型版本号
         expire_time: 过期时间（可选）
         gps_longitude: 经度（可选，用于地理位置查询）
@@ -397,32 +597,34 @@ async def create_genius_loci_record(
         创建的记录数据，失败则返回 None
     """
     try:
-        client = db.get_client(use_admin=True)
+        client = db.get_rest_client(use_admin=True)
 
         # 构建插入数据
-        insert_data = {
-            "bubble_id": bubble_id,
-            "user_id": user_id,
-            "ai_process_type": ai_process_type,
-            "ai_result": ai_result,
-            "model_version": model_version,
-            "is_effective": 1
-        }
-
-        if expire_time:
-            insert_data["expire_time"] = expire_time
-
-        # 添加经纬度信息（如果提供）
-        if gps_longitude is not None:
-            insert_data["gps_longitude"] = gps_longitude
-        if gps_latitude is not None:
-            insert_data["gps_latitude"] = gps_latitude
-
-        response = client.table("genius_loci_record").insert(insert_data).execute()
+        insert_data = build_genius_loci_row(
+            bubble_id=bubble_id,
+            user_id=user_id,
+            ai_process_type=ai_process_type,
+            ai_result=ai_result,
+            model_version=model_version,
+            expire_time=expire_time,
+            gps_longitude=gps_longitude,
+            gps_latitude=gps_latitude
+        )
 
-        if response.data:
+        response = await client.post(
+            "/genius_loci_record",
+            json=insert_data,
+            headers={"Prefer": "return=representation"}
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        if data:
             logger.info(f"成功创建地灵AI记录, bubble_id={bubble_id}, user_id={user_id}, type={ai_process_type}")
-            return response.data[0]
+            invalidate_ai_summary_cache(bubble_id)
+            if gps_longitude is not None and gps_latitude is not None:
+                invalidate_nearby_memory_cache(gps_longitude, gps_latitude)
+            return data[0]
         else:
             raise Exception("创建记录失败: 无返回数据")
 
@@ -431,6 +633,49 @@ async def create_genius_loci_record(
         return None
 
 
+# ========================================
+# 附近记忆查询缓存（进程内，短 TTL）
+# ========================================
+# 每次首聊冷启动都跑一次 1km 记忆检索；同一街角的用户几分钟内会
+# 重复完全相同的地理查询。坐标保留 3 位小数（约 111m 网格）聚键，
+# 命中直接复用上次结果。TTL 取短值，新记忆入库时再主动失效所在网格。
+
+_NEARBY_MEMORY_CACHE_MAX = 8192
+_NEARBY_MEMORY_TTL_HIT = 120.0  # 命中结果缓存时长（秒）
+_NEARBY_MEMORY_TTL_MISS = 10.0  # 空结果缓存时长（秒），防穿透但不长期挡住新记忆
+_nearby_memory_cache: Dict[tuple, tuple] = {}
+
+# 未命中哨兵（区别于缓存的 None 值 = "查过且附近无记忆"）
+_MEMORY_CACHE_MISS = object()
+
+
+def _nearby_memory_cache_get(key: tuple):
+    """读缓存，过期即删除；未命中返回 _MEMORY_CACHE_MISS"""
+    entry = _nearby_memory_cache.get(key)
+    if entry is None:
+        return _MEMORY_CACHE_MISS
+    expire_at, value = entry
+    if time.monotonic() >= expire_at:
+        _nearby_memory_cache.pop(key, None)
+        return _MEMORY_CACHE_MISS
+    return value
+
+
+def _nearby_memory_cache_set(key: tuple, value, ttl: float):
+    """写缓存；超限时按插入序淘汰最旧条目"""
+    if len(_nearby_memory_cache) >= _NEARBY_MEMORY_CACHE_MAX:
+        _nearby_memory_cache.pop(next(iter(_nearby_memory_cache)), None)
+    _nearby_memory_cache[key] = (time.monotonic() + ttl, value)
+
+
+def invalidate_nearby_memory_cache(gps_longitude: float, gps_latitude: float):
+    """新记忆落库后失效所在网格的缓存条目（各半径/类型维度一并清除）"""
+    cell = (round(gps_longitude, 3), round(gps_latitude, 3))
+    stale_keys = [k for k in _nearby_memory_cache if k[:2] == cell]
+    for k in stale_keys:
+        _nearby_memory_cache.pop(k, None)
+
+
 async def get_nearby_genius_loci_memory(
     gps_longitude: float,
     gps_latitude: float,
@@ -454,53 +699,73 @@ async def get_nearby_genius_loci_memory(
     Returns:
         最近的一条记忆记录，如果没有则返回 None
     """
-    try:
-        client = db.get_client()
+    # 网格聚键：查询不区分用户（exclude_user_id 已废弃不参与键），
+    # 约 111m 内的请求共享同一条缓存
+    cache_key = (round(gps_longitude, 3), round(gps_latitude, 3), radius_km, ai_process_type)
+    cached = _nearby_memory_cache_get(cache_key)
+    if cached is not _MEMORY_CACHE_MISS:
+        logger.debug(f"附近记忆缓存命中: cell={cache_key[:2]}")
+        return cached
 
-        # 计算边界框（约等于指定半径）
-        # 1度约等于111公里，所以 radius_km 对应约 radius_km/111 度
-        delta = radius_km / 111.0
+    try:
+        client = db.get_rest_client()
 
-        min_lon = gps_longitude - delta
-        max_lon = gps_longitude + delta
-        min_lat = gps_latitude - delta
-        max_lat = gps_latitude + delta
+        # 按查询半径选择 geohash 前缀精度，目标单元格 + 8 个邻居即可覆盖半径，
+        # 把 4 个经纬度范围比较替换为一次可走前缀索引的 OR 查询
+        precision = _geohash_precision_for_radius(radius_km)
+        cell = geohash.encode(gps_latitude, gps_longitude, precision)
+        cells = [cell] + geohash.neighbors(cell)
+        geohash_filter = ",".join(f"geohash.like.{c}*" for c in cells)
 
-        # 直接查询 genius_loci_record 表（该表已有 gps_longitude 和 gps_latitude 字段）
+        # 直接查询 genius_loci_record 表（geohash 列在插入时冗余写入）
         # 地灵记住所有用户在该位置的记忆（不排除任何用户）
-        query = client.table("genius_loci_record").select("*")
-        query = query.gte("gps_longitude", min_lon)
-        query = query.lte("gps_longitude", max_lon)
-        query = query.gte("gps_latitude", min_lat)
-        query = query.lte("gps_latitude", max_lat)
-        query = query.eq("ai_process_type", ai_process_type)
-        query = query.eq("is_effective", 1)
-
-        # 按处理时间倒序，获取最近的记录
-        query = query.order("process_time", desc=True).limit(1)
-
-        response = query.execute()
+        response = await client.get(
+            "/genius_loci_record",
+            params=[
+                ("select", "*"),
+                ("or", f"({geohash_filter})"),
+                ("ai_process_type", f"eq.{ai_process_type}"),
+                ("is_effective", "eq.1"),
+                # 按处理时间倒序，获取最近的记录
+                ("order", "process_time.desc"),
+                ("limit", "1")
+            ]
+        )
+        response.raise_for_status()
+        data = response.json()
 
-        if response.data:
-            record = response.data[0]
+        if data:
+            record = data[0]
             logger.info(f"✓ 检索到附近地灵记忆: id={record['id']}, bubble_id={record['bubble_id']}, user_id={record['user_id']}")
+            _nearby_memory_cache_set(cache_key, record, _NEARBY_MEMORY_TTL_HIT)
             return record
         else:
+            logger.info(f"附近 {radius_km}km 内无地灵记忆: precision={precision}, cells={cells}")
+
             # 调试：查询所有符合条件的记录（不限制地理位置）
-            logger.warning(f"附近 {radius_km}km 内无地灵记忆，开始调试查询...")
-            debug_query = client.table("genius_loci_record").select("*")
-            debug_query = debug_query.eq("ai_process_type", ai_process_type).eq("is_effective", 1)
-            debug_query = debug_query.order("process_time", desc=True).limit(5)
-
-            debug_response = debug_query.execute()
-            if debug_response.data:
-                logger.info(f"数据库中存在 {len(debug_response.data)} 条地灵记忆记录:")
-                for i, rec in enumerate(debug_response.data):
-                    logger.info(f"  [{i+1}] id={rec['id']}, gps=({rec.get('gps_longitude')}, {rec.get('gps_latitude')}), user_id={rec['user_id']}, bubble_id={rec.get('bubble_id')}")
-            else:
-                logger.warning("数据库中不存在任何地灵记忆记录（ai_process_type=5, is_effective=1）")
-
-            logger.info(f"查询范围: longitude[{min_lon:.6f}, {max_lon:.6f}], latitude[{min_lat:.6f}, {max_lat:.6f}]")
+            # 注意：该探测会在记忆未命中（恰好是首聊冷启动的慢分支）上追加一次全表查询，
+            # 只在 DEBUG 级别且 1% 采样时执行，避免把未命中路径的 DB 压力翻倍
+            if logger.isEnabledFor(logging.DEBUG) and random.random() < 0.01:
+                debug_response = await client.get(
+                    "/genius_loci_record",
+                    params=[
+                        ("select", "*"),
+                        ("ai_process_type", f"eq.{ai_process_type}"),
+                        ("is_effective", "eq.1"),
+                        ("order", "process_time.desc"),
+                        ("limit", "5")
+                    ]
+                )
+                debug_response.raise_for_status()
+                debug_data = debug_response.json()
+                if debug_data:
+                    logger.debug(f"数据库中存在 {len(debug_data)} 条地灵记忆记录:")
+                    for i, rec in enumerate(debug_data):
+                        logger.debug(f"  [{i+1}] id={rec['id']}, gps=({rec.get('gps_longitude')}, {rec.get('gps_latitude')}), user_id={rec['user_id']}, bubble_id={rec.get('bubble_id')}")
+                else:
+                    logger.debug("数据库中不存在任何地灵记忆记录（ai_process_type=5, is_effective=1）")
+
+            _nearby_memory_cache_set(cache_key, None, _NEARBY_MEMORY_TTL_MISS)
             return None
 
     except Exception as e:
@@ -530,9 +795,7 @@ async def get_bubble_genius_loci_records(
             .order("process_time", desc=True) \
             .execute()
 
-        if response.data:
-            return response.data
-        return []
+        return response.data or []
 
     except Exception as e:
         logger.error(f"获取气泡AI记录失败: {e}")
@@ -569,15 +832,51 @@ async def get_user_genius_loci_memories(
 
         response = query.execute()
 
-        if response.data:
-            return response.data
-        return []
+        return response.data or []
 
     except Exception as e:
         logger.error(f"获取用户AI记录失败: {e}")
         return []
 
 
+# /ai-summary 轮询缓存：客户端在总结生成期间会高频轮询同一个 bubble_id，
+# 用进程内短 TTL 缓存把每秒 N 次相同查询折叠为 1 次 DB 查询。
+# 未生成（202 轮询）只缓存 1 秒；已生成的总结不可变，可以缓存更久。
+_AI_SUMMARY_CACHE_MAX = 10000
+_AI_SUMMARY_TTL_HIT = 30.0
+_AI_SUMMARY_TTL_MISS = 1.0
+_ai_summary_cache: Dict[tuple, tuple] = {}
+
+# 缓存未命中的哨兵（与"查无记录"的 None 结果区分开）
+_CACHE_MISS = object()
+
+
+def _ai_summary_cache_get(key: tuple):
+    """读缓存，过期即删除；未命中返回 _CACHE_MISS"""
+    entry = _ai_summary_cache.get(key)
+    if entry is None:
+        return _CACHE_MISS
+    expire_at, value = entry
+    if time.monotonic() >= expire_at:
+        _ai_summary_cache.pop(key, None)
+        return _CACHE_MISS
+    return value
+
+
+def _ai_summary_cache_set(key: tuple, value, ttl: float):
+    """写缓存，超出容量时按插入顺序淘汰最老的条目"""
+    if len(_ai_summary_cache) >= _AI_SUMMARY_CACHE_MAX:
+        _ai_summary_cache.pop(next(iter(_ai_summary_cache)), None)
+    _ai_summary_cache[key] = (time.monotonic() + ttl, value)
+
+
+def invalidate_ai_summary_cache(bubble_id: int):
+    """新记录写入后，使该 bubble_id 的所有缓存条目失效"""
+    stale_keys = [k for k in _ai_summary_cache if k[0] == bubble_id]
+    for k in stale_keys:
+        _ai_summary_cache.pop(k, None)
+
+
 async def get_ai_summary_by_bubble_id(
     bubble_id: int,
     user_id: Optional[int] = None
@@ -592,36 +891,50 @@ async def get_ai_summary_by_bubble_id(
     Returns:
         AI 记录字典，包含 ai_result 字段；如果不存在或未生成则返回 None
     """
+    # 缓存 key 带上 user_id，保持权限过滤语义
+    cache_key = (bubble_id, user_id)
+    cached = _ai_summary_cache_get(cache_key)
+    if cached is not _CACHE_MISS:
+        return cached
+
     try:
-        client = db.get_client()
+        client = db.get_rest_client()
 
         # 构建查询
-        query = client.table("genius_loci_record").select("*")
-        query = query.eq("bubble_id", bubble_id)
-        query = query.eq("ai_process_type", 5)  # 5-对话总结
-        query = query.eq("is_effective", 1)  # 只查询有效记录
+        params = [
+            ("select", "*"),
+            ("bubble_id", f"eq.{bubble_id}"),
+            ("ai_process_type", "eq.5"),  # 5-对话总结
+            ("is_effective", "eq.1")  # 只查询有效记录
+        ]
 
         # 如果指定了 user_id，进行权限验证
         if user_id is not None:
-            query = query.eq("user_id", user_id)
+            params.append(("user_id", f"eq.{user_id}"))
 
         # 按处理时间倒序，获取最新的总结
-        query = query.order("process_time", desc=True).limit(1)
+        params.append(("order", "process_time.desc"))
+        params.append(("limit", "1"))
 
-        response = query.execute()
+        response = await client.get("/genius_loci_record", params=params)
+        response.raise_for_status()
+        data = response.json()
 
-        if response.data:
-            record = response.data[0]
+        if data:
+            record = data[0]
             logger.info(f"找到 AI 总结记录: bubble_id={bubble_id}, record_id={record['id']}")
 
             # 检查 ai_result 是否为空
             if not record.get("ai_result"):
                 logger.warning(f"AI 总结内容为空: bubble_id={bubble_id}")
+                _ai_summary_cache_set(cache_key, None, _AI_SUMMARY_TTL_MISS)
                 return None
 
+            _ai_summary_cache_set(cache_key, record, _AI_SUMMARY_TTL_HIT)
             return record
         else:
             logger.info(f"未找到 AI 总结记录: bubble_id={bubble_id}")
+            _ai_summary_cache_set(cache_key, None, _AI_SUMMARY_TTL_MISS)
             return None
 
     except Exception as e:
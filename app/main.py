@@ -12,6 +12,7 @@ from app.api import router
 from app.core.config import settings
 from app.core.database import db
 from app.core.oss_storage import oss_storage
+from app.services.genius_loci_service import archive_queue, session_manager
 
 # 配置日志
 logging.basicConfig(
@@ -50,9 +51,16 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"OSS 连接失败: {e}")
 
+    # 启动归档批量写入队列与会话超时检查任务
+    archive_queue.start()
+    session_manager.start()
+
     yield
 
-    # 关闭时执行
+    # 关闭时执行（先停会话扫描、把归档队列中剩余记录落库，再关闭数据库连接池）
+    await session_manager.stop()
+    await archive_queue.stop()
+    await db.close()
     logger.info("气泡笔记 API 服务关闭")
 
 
@@ -132,5 +140,10 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        loop="auto",
+        http="httptools",
+        workers=1 if settings.DEBUG else settings.WORKERS,
+        timeout_keep_alive=settings.TIMEOUT_KEEP_ALIVE,
+        limit_concurrency=settings.LIMIT_CONCURRENCY,
         log_level="info"
     )
@@ -2,11 +2,17 @@
 气泡笔记业务服务
 """
 
+import asyncio
 import logging
 from typing import Optional, List, Dict, Any
 
 from app.utils.emotion_analyzer import analyze_emotion
-from app.core.database import create_bubble_note, update_bubble_note, get_bubble_note_by_id
+from app.core.database import (
+    create_bubble_note,
+    update_bubble_note,
+    get_bubble_note_by_id,
+    delete_bubble_note
+)
 from app.core.oss_storage import oss_storage
 from app.models.schemas import BubbleNoteCreate
 
@@ -74,43 +80,56 @@ class BubbleNoteService:
             # 第二阶段: 多媒体与智能异步处理
             # ========================================
 
-            # 2.1 图片上传 (如果有)
-            image_urls_str = None
+            # 2.1 图片上传与情感识别并发执行
+            # 两者无数据依赖：上传是网络受限（秒级），情感识别是模型推理；
+            # 并发后端到端延迟从 t_upload + t_emotion 降到 max(t_upload, t_emotion)
+            image_urls = None
             note_type = data.note_type  # 默认为纯文本
-            print("go_note_type", note_type)
-
-            if note_type:
-                if has_images:
-                    try:
-                        # 并发上传所有图片到 OSS
-                        uploaded_urls = await oss_storage.upload_images_batch(
-                            images_data,
-                            data.user_id
-                        )
-                        note_type = 2
-                        # 将 URL 列表转换为逗号分隔的字符串
-                        image_urls_str = ",".join(uploaded_urls)
-
-                        logger.info(f"图片上传成功: {len(uploaded_urls)} 张")
-
-                    except Exception as e:
-                        # 图片上传失败,触发异常熔断
-                        logger.error(f"图片上传失败,终止流程: {e}")
-                        raise Exception(f"图片上传失败: {e}")
-                else:
-                    # 纯文本笔记,保留原有的 image_urls (如果是更新模式)
-                    if is_update and existing_note.get("image_urls"):
-                        note_type = 1
-                        image_urls_str = existing_note["image_urls"]
-                        note_type = existing_note["note_type"]
-
-            # 2.2 情感识别 (如果有文本)
-            emotion = "未知"  # 默认情感
+            logger.debug(f"请求 note_type: {note_type}")
+
+            upload_task = None
+            if note_type and has_images:
+                upload_task = asyncio.create_task(
+                    oss_storage.upload_images_batch(images_data, data.user_id)
+                )
 
+            emotion_task = None
             if has_content:
+                # 同步模型调用移入线程池：不阻塞事件循环，并与上传重叠
+                emotion_task = asyncio.create_task(
+                    asyncio.to_thread(analyze_emotion, data.content)
+                )
+
+            # 2.2 汇合图片上传结果
+            if upload_task is not None:
+                try:
+                    uploaded_urls = await upload_task
+                    note_type = 2
+                    # URL 列表原样入库（image_urls 为 TEXT[] 数组列）
+                    image_urls = uploaded_urls
+
+                    logger.info(f"图片上传成功: {len(uploaded_urls)} 张")
+
+                except Exception as e:
+                    # 图片上传失败,触发异常熔断（先取消情感任务，避免悬挂）
+                    if emotion_task is not None:
+                        emotion_task.cancel()
+                    logger.error(f"图片上传失败,终止流程: {e}")
+                    raise Exception(f"图片上传失败: {e}")
+            elif is_update and existing_note.get("image_urls"):
+                # 纯文本更新,保留原有的 image_urls 与笔记类型
+                image_urls = existing_note["image_urls"]
+                note_type = existing_note["note_type"]
+            elif not note_type:
+                # 未指定类型且无图片,落为纯文本
+                note_type = 2
+
+            # 2.3 汇合情感识别结果
+            emotion = "未知"  # 默认情感
+
+            if emotion_task is not None:
                 try:
-                    # 调用情感分析模型
-                    emotion = analyze_emotion(data.content)
+                    emotion = await emotion_task
                     logger.info(f"情感识别结果: {emotion}")
                 except Exception as e:
                     logger.error(f"情感识别失败,使用默认值: {e}")
@@ -128,7 +147,7 @@ class BubbleNoteService:
                 "user_id": data.user_id,
                 "note_type": note_type,
                 "content": data.content if has_content else "",
-                "image_urls": image_urls_str,
+                "image_urls": image_urls,
                 "gps_longitude": data.gps_longitude,
                 "gps_latitude": data.gps_latitude,
                 "status": data.status,
@@ -175,8 +194,6 @@ class BubbleNoteService:
         Returns:
             是否删除成功
         """
-        from database import delete_bubble_note
-
         try:
             success = await delete_bubble_note(note_id, user_id)
             if success:
@@ -211,9 +228,20 @@ def validate_coordinates(longitude: float, latitude: float) -> bool:
     return -180 <= longitude <= 180 and -90 <= latitude <= 90
 
 
+# note_type 查表: (has_content, has_images) -> 笔记类型
+# 全部组合枚举成常量表，省掉逐请求的多分支判断
+# (无内容无图片的组合应在校验阶段被拦截，这里兜底为纯文)
+_NOTE_TYPE_TABLE = {
+    (False, False): 2,  # 默认纯文
+    (False, True): 1,   # 图文
+    (True, False): 2,   # 纯文
+    (True, True): 1,    # 图文
+}
+
+
 def determine_note_type(has_content: bool, has_images: bool) -> int:
     """
-    确定笔记类型
+    确定笔记类型（查表实现）
 
     Args:
         has_content: 是否有文本内容
@@ -222,12 +250,7 @@ def determine_note_type(has_content: bool, has_images: bool) -> int:
     Returns:
         笔记类型 (1-图文/2-纯文)
     """
-    if has_images:
-        return 1  # 图文
-    elif has_content:
-        return 2  # 纯文
-    else:
-        return 2  # 默认纯文 (但这种情况应该在校验阶段被拦截)
+    return _NOTE_TYPE_TABLE[(has_content, has_images)]
 
 
 # ========================================
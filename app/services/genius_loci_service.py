@@ -8,16 +8,25 @@
 3. 适配实际表结构（bubble_id, ai_process_type等字段）
 """
 
+import heapq
 import logging
-import uuid
+import secrets
 import asyncio
 import time
-import json
-from typing import AsyncGenerator, Optional, List, Dict, Any
+import weakref
+from collections import deque
+
+import orjson
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Deque, Optional, List, Dict, Any
 from app.services.vision_service import vision_service
 from app.services.chat_service import chat_service
+from app.services.bubble_service import bubble_service
+from app.models.schemas import BubbleNoteCreate
 from app.core.database import (
     create_genius_loci_record,
+    create_genius_loci_records_batch,
+    build_genius_loci_row,
     get_nearby_genius_loci_memory,
     create_bubble_note
 )
@@ -35,11 +44,56 @@ SESSION_TIMEOUT = 30 * 60  # 会话超时时间（秒），默认30分钟
 AUTO_ARCHIVE_TURNS = 100  # 每100轮对话后自动归档并开启新会话
 AI_PROCESS_TYPE_CHAT_SUMMARY = 5  # AI处理类型：5-对话总结
 
+# 滚动摘要参数：history 只保留最近 HISTORY_RECENT_ENTRIES 条消息，
+# 超出后把最旧的 HISTORY_FOLD_ENTRIES 条折叠进 summary（一次小 LLM 调用）。
+# 归档时只需总结剩余的短 history，总 token 成本从 O(轮数²) 降为 O(轮数)，
+# 单会话内存占用也不再随对话无限增长
+HISTORY_RECENT_ENTRIES = 40  # 最近保留的消息条数（20 轮）
+HISTORY_FOLD_ENTRIES = 20  # 每次折叠的消息条数（10 轮）
+
+# 首轮上下文准备预算（秒）：视觉/记忆在预算内就注入开场上下文，
+# 超时则直接开流——宁可首响应少一点场景信息，也不让用户盯着空屏等
+FIRST_TURN_PREP_TIMEOUT = 0.4
+
+# 流式转发的分批冲刷阈值：LLM 高速出 token 时逐 token 下发会让
+# 每个小片段各走一遍 ASGI send/编码/flush，服务端和客户端 CPU 都被
+# 协议开销吃掉。积累到字符阈值或时限到点才 yield 一次合并片段
+STREAM_FLUSH_CHARS = 128  # 冲刷字符阈值（中文每字符约 3 字节）
+STREAM_FLUSH_INTERVAL = 0.05  # 冲刷时限（秒），token 停顿时保证及时下发
+
+# 流式输出中的会话元数据哨兵 key：
+# genius_loci_chat_stream 的第一个产出是 {SESSION_ID_KEY: session_id}，
+# 之后才是文本片段，调用方据此 O(1) 获取会话 ID
+SESSION_ID_KEY = "__session_id__"
+
 
 # ========================================
 # 会话状态管理（内存存储 + 超时机制）
 # ========================================
 
+@dataclass(slots=True)
+class Session:
+    """
+    会话记录
+
+    slots 布局：万级并发会话下比 dict-of-dicts 省 3-5 倍内存
+    （无逐实例 __dict__、无嵌套 location 字典），属性访问也比
+    字典查键更快。字段即会话的全部状态。
+    """
+
+    user_id: int
+    gps_longitude: float
+    gps_latitude: float
+    image_url: Optional[str] = None
+    history: Deque[Dict[str, str]] = field(default_factory=deque)  # 对话历史（deque：折叠时 popleft O(1)）
+    bubble_id: Optional[int] = None  # 关联的气泡 ID（首次对话时创建）
+    is_first: bool = True  # 是否为首次对话（唯一的首聊状态位）
+    conversation_turns: int = 0  # 对话轮数计数器
+    summary: str = ""  # 已折叠历史的滚动摘要
+    summary_turns: int = 0  # 已折叠进摘要的轮数
+    last_activity: float = 0.0  # 最后活跃时间（monotonic 时间戳，TTL 判定依据）
+
+
 class SessionManager:
     """会话状态管理器（单例模式 + 超时机制）"""
 
@@ -56,22 +110,57 @@ class SessionManager:
         if SessionManager._initialized:
             return
 
-        # 会话存储：{session_id: {...}}
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self.last_activity: Dict[str, float] = {}  # 最后活跃时间
+        # 会话存储：{session_id: Session}（含 last_activity 字段，TTL 语义：
+        # get_session 访问时惰性判超时，单字典省掉并行的活跃时间字典）
+        self.sessions: Dict[str, Session] = {}
+
+        # 到期时间最小堆 [(expire_at, session_id), ...]：
+        # 超时检查只弹堆顶已到期的条目，成本与实际过期数成正比，
+        # 不再每分钟全量扫描 last_activity。活跃刷新时只新增条目
+        # 不删旧条目（惰性失效），弹出时与 last_activity 对账去伪
+        self._expiry_heap: List[tuple] = []
+
+        # 每会话互斥锁：同一 session_id 的并发请求串行化会话状态变更
+        # （history 追加顺序、轮数计数），避免竞态破坏 AUTO_ARCHIVE_TURNS
+        # 触发点。弱引用字典：锁无人持有时自动回收，会话清除后不泄漏
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        # 后台任务（归档/对话收尾）的强引用集合：create_task 产物
+        # 若无人持有会被 GC 悄悄取消，完成后经回调移除并记录异常
+        self._background_tasks: set = set()
+
+        # 超时检查后台任务（在应用 lifespan 中 start/stop，
+        # 不在 __init__ 里 create_task：模块导入时没有运行中的事件循环，
+        # 任务要么抛 RuntimeError 要么挂在一次性循环上永不执行）
+        self._expiry_task: Optional[asyncio.Task] = None
 
         SessionManager._initialized = True
         logger.info("会话管理器初始化成功（含超时机制）")
 
-        # 启动超时检查任务
-        asyncio.create_task(self._check_expired_sessions())
+    def start(self):
+        """启动超时检查后台任务（在应用启动时调用）"""
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._check_expired_sessions())
+            logger.info("会话超时检查任务已启动")
+
+    async def stop(self):
+        """停止后台任务（在应用关闭时调用）"""
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            try:
+                await self._expiry_task
+            except asyncio.CancelledError:
+                pass
+            self._expiry_task = None
+            logger.info("会话超时检查任务已停止")
 
     def create_session(
         self,
         user_id: int,
         gps_longitude: float,
         gps_latitude: float,
-        image_url: Optional[str] = None
+        image_url: Optional[str] = None,
+        **overrides: Any
     ) -> str:
         """
         创建新会话
@@ -81,71 +170,135 @@ class SessionManager:
             gps_longitude: 经度
             gps_latitude: 纬度
             image_url: 图片 URL（可选）
+            **overrides: 其余 Session 字段的初值（渐进式归档继承
+                上下文用），构造时一次写入，免去创建后逐字段回填
 
         Returns:
             会话 ID
         """
-        session_id = str(uuid.uuid4())
-
-        self.sessions[session_id] = {
-            "user_id": user_id,
-            "location": {
-                "longitude": gps_longitude,
-                "latitude": gps_latitude
-            },
-            "image_url": image_url,
-            "history": [],  # 对话历史
-            "bubble_id": None,  # 关联的气泡 ID（首次对话时创建）
-            "is_first": True,  # 是否为首次对话
-            "vision_analyzed": False,  # 是否已进行视觉分析
-            "context_initialized": False,  # 是否已初始化上下文
-            "conversation_turns": 0  # 对话轮数计数器
-        }
+        # 直接生成 128 位随机 hex 串：跳过 uuid.UUID 对象构造和
+        # 版本位整理（会话 ID 只当不透明字符串用，不需要 UUID 语义）
+        session_id = secrets.token_hex(16)
+
+        now = time.monotonic()
+        self.sessions[session_id] = Session(
+            user_id=user_id,
+            gps_longitude=gps_longitude,
+            gps_latitude=gps_latitude,
+            image_url=image_url,
+            last_activity=now,
+            **overrides
+        )
 
-        self.last_activity[session_id] = time.time()
+        heapq.heappush(self._expiry_heap, (now + SESSION_TIMEOUT, session_id))
 
-        logger.info(f"创建新会话: session_id={session_id}, user_id={user_id}")
+        logger.info("创建新会话: session_id=%s, user_id=%s", session_id, user_id)
         return session_id
 
-    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """获取会话信息"""
-        return self.sessions.get(session_id)
+    def get_session(self, session_id: str) -> Optional[Session]:
+        """获取会话信息（惰性超时：已过期的会话视同不存在，归档仍由后台扫描完成）"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_activity > SESSION_TIMEOUT:
+            return None
+        return session
+
+    def update_activity(self, session_id: str, session: Optional[Session] = None):
+        """更新会话活跃时间（调用方已持有会话对象时可直接传入，省一次查找）"""
+        if session is None:
+            session = self.sessions.get(session_id)
+        if session is not None:
+            now = time.monotonic()
+            session.last_activity = now
+            heapq.heappush(self._expiry_heap, (now + SESSION_TIMEOUT, session_id))
+            logger.debug("更新会话活跃时间: session_id=%s", session_id)
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        """获取（或创建）会话专属的互斥锁"""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    async def finalize_turn(
+        self, session_id: str, user_message: str, assistant_message: str
+    ) -> int:
+        """
+        一轮对话收尾：追加用户/助手两条历史并递增轮数
 
-    def update_activity(self, session_id: str):
-        """更新会话活跃时间"""
-        if session_id in self.sessions:
-            self.last_activity[session_id] = time.time()
-            logger.debug(f"更新会话活跃时间: session_id={session_id}")
+        三处状态变更在一次取锁内完成（原先是三次独立取锁），
+        超长历史同样在这里把最旧片段折叠进滚动摘要。
 
-    def add_to_history(self, session_id: str, role: str, content: str):
-        """添加对话记录到历史"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["history"].append({
-                "role": role,
-                "content": content
-            })
-            logger.debug(f"添加到会话历史: session_id={session_id}, role={role}")
-
-    def increment_turns(self, session_id: str):
-        """增加对话轮数"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["conversation_turns"] += 1
-            turns = self.sessions[session_id]["conversation_turns"]
-            logger.debug(f"对话轮数: session_id={session_id}, turns={turns}")
-            return turns
-        return 0
+        Returns:
+            递增后的对话轮数（会话不存在时返回 0）
+        """
+        async with self._lock(session_id):
+            session = self.sessions.get(session_id)
+            if session is None:
+                return 0
+
+            history = session.history
+            history.append({"role": "user", "content": user_message})
+            history.append({"role": "assistant", "content": assistant_message})
+            logger.debug("记录对话历史: session_id=%s", session_id)
+
+            # 历史超限：popleft 摘下最旧片段，异步折叠进 summary
+            # （deque 左端弹出 O(1)，不像 list 切片删除要整段左移）
+            if len(history) >= HISTORY_RECENT_ENTRIES + HISTORY_FOLD_ENTRIES:
+                old_chunk = [history.popleft() for _ in range(HISTORY_FOLD_ENTRIES)]
+                session.summary_turns += len(old_chunk) // 2
+                self.track_background_task(
+                    asyncio.create_task(self._fold_into_summary(session_id, old_chunk))
+                )
+
+            session.conversation_turns += 1
+            return session.conversation_turns
+
+    async def _fold_into_summary(self, session_id: str, old_chunk: List[Dict[str, str]]):
+        """把一段旧对话压缩后追加到会话的滚动摘要"""
+        try:
+            chunk_summary = await chat_service.summarize_conversation(old_chunk)
+            if not chunk_summary:
+                chunk_summary = _build_simple_summary(old_chunk)
+
+            session = self.sessions.get(session_id)
+            if session is not None:
+                if session.summary:
+                    session.summary = f"{session.summary}\n{chunk_summary}"
+                else:
+                    session.summary = chunk_summary
+                logger.debug("历史片段已折叠进摘要: session_id=%s", session_id)
+
+        except Exception as e:
+            logger.error(f"折叠历史片段失败: {e}")
+
+    def track_background_task(self, task: asyncio.Task):
+        """持有后台任务引用，完成后移除并记录异常"""
+        self._background_tasks.add(task)
+
+        def _done(t: asyncio.Task):
+            self._background_tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                logger.error(f"后台任务异常: {t.exception()}")
+
+        task.add_done_callback(_done)
 
     def get_turns(self, session_id: str) -> int:
         """获取当前对话轮数"""
-        if session_id in self.sessions:
-            return self.sessions[session_id].get("conversation_turns", 0)
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session.conversation_turns
         return 0
 
-    def set_bubble_id(self, session_id: str, bubble_id: int):
+    async def set_bubble_id(self, session_id: str, bubble_id: int):
         """设置关联的气泡 ID"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["bubble_id"] = bubble_id
-            logger.info(f"关联气泡ID: session_id={session_id}, bubble_id={bubble_id}")
+        async with self._lock(session_id):
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.bubble_id = bubble_id
+                logger.info("关联气泡ID: session_id=%s, bubble_id=%s", session_id, bubble_id)
 
     async def _check_expired_sessions(self):
         """定期检查并清理超时会话（后台任务）"""
@@ -153,15 +306,20 @@ class SessionManager:
             try:
                 await asyncio.sleep(60)  # 每分钟检查一次
 
-                current_time = time.time()
-                expired_sessions = []
+                current_time = time.monotonic()
 
-                for session_id, last_time in self.last_activity.items():
-                    if current_time - last_time > SESSION_TIMEOUT:
-                        expired_sessions.append(session_id)
+                # 只处理堆顶已到期的条目（O(k log N)，k=实际过期数）
+                while self._expiry_heap and self._expiry_heap[0][0] <= current_time:
+                    _, session_id = heapq.heappop(self._expiry_heap)
+
+                    expired_session = self.sessions.get(session_id)
+                    if expired_session is None:
+                        # 会话已清除，惰性失效的陈旧条目，直接丢弃
+                        continue
+                    if current_time - expired_session.last_activity <= SESSION_TIMEOUT:
+                        # 活跃时间被刷新过（刷新时已压入新的到期条目），丢弃本条
+                        continue
 
-                # 归档超时会话
-                for session_id in expired_sessions:
                     logger.info(f"会话超时，准备归档: session_id={session_id}")
                     await self._archive_session_sync(session_id)
 
@@ -177,12 +335,14 @@ class SessionManager:
 
             # 调用异步归档
             await archive_conversation(
-                bubble_id=session.get("bubble_id"),
-                user_id=session["user_id"],
+                bubble_id=session.bubble_id,
+                user_id=session.user_id,
                 session_id=session_id,
-                conversation=session["history"],
-                gps_longitude=session["location"]["longitude"],
-                gps_latitude=session["location"]["latitude"]
+                conversation=list(session.history),
+                gps_longitude=session.gps_longitude,
+                gps_latitude=session.gps_latitude,
+                summary_so_far=session.summary,
+                prior_turns=session.summary_turns
             )
 
             # 清除会话
@@ -195,19 +355,134 @@ class SessionManager:
         """清除会话"""
         if session_id in self.sessions:
             del self.sessions[session_id]
-        if session_id in self.last_activity:
-            del self.last_activity[session_id]
-        logger.info(f"清除会话: session_id={session_id}")
+        logger.info("清除会话: session_id=%s", session_id)
 
 
 # 全局会话管理器实例
 session_manager = SessionManager()
 
 
+# ========================================
+# 归档写入队列（批量落库）
+# ========================================
+
+ARCHIVE_BATCH_MAX = 64  # 单次批量插入的最大行数
+ARCHIVE_FLUSH_INTERVAL = 0.2  # 攒批等待时间（秒）
+
+
+class ArchiveQueue:
+    """
+    归档写入队列
+
+    归档行先入内存队列，由常驻后台任务攒批后一次性批量插入
+    genius_loci_record 表，把每条归档一次网络往返摊薄成
+    每批一次往返。后台任务在应用 lifespan 中启动/停止。
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1024)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台消费任务（在应用启动时调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume())
+            logger.info("归档写入队列已启动")
+
+    async def stop(self):
+        """停止后台任务并清空剩余行（在应用关闭时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # 关闭前把队列中剩余的行一次性落库
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        if remaining:
+            await create_genius_loci_records_batch(remaining)
+        logger.info("归档写入队列已停止")
+
+    async def put(self, row: Dict[str, Any]):
+        """提交一行归档记录"""
+        if self._task is None:
+            # 后台任务未启动（如脚本/测试环境），退化为直接单条插入
+            await create_genius_loci_records_batch([row])
+            return
+        await self._queue.put(row)
+
+    async def _consume(self):
+        """后台消费：攒够 ARCHIVE_BATCH_MAX 行或等待超时后批量插入"""
+        while True:
+            rows: List[Dict[str, Any]] = []
+            try:
+                rows.append(await self._queue.get())
+
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + ARCHIVE_FLUSH_INTERVAL
+                while len(rows) < ARCHIVE_BATCH_MAX:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rows.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                await create_genius_loci_records_batch(rows)
+                rows = []
+
+            except asyncio.CancelledError:
+                # stop() 取消时手里可能已攒了一批未落库的行（含被打断的
+                # 在途插入），补写完再退出，否则正常重启会丢刚归档的对话
+                if rows:
+                    try:
+                        await create_genius_loci_records_batch(rows)
+                    except Exception as e:
+                        logger.error(f"归档收尾落库失败: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"归档批量写入异常: {e}")
+
+
+# 全局归档队列实例
+archive_queue = ArchiveQueue()
+
+
 # ========================================
 # 地灵对话核心逻辑
 # ========================================
 
+async def _finalize_chat_turn(
+    session_id: str,
+    user_message: str,
+    full_response: str,
+    bubble_task: Optional[asyncio.Task]
+):
+    """
+    对话收尾后台任务：最后一个片段下发后异步记账
+
+    历史追加/轮数递增不再占用请求协程——生成器 yield 完即返回，
+    连接尽早释放。首轮的气泡创建任务在此兜底等待，保证 bubble_id
+    在本轮记录完成前已写回会话（供后续归档关联）。
+    """
+    if bubble_task is not None and not bubble_task.done():
+        try:
+            await bubble_task
+        except Exception:
+            pass  # 失败已在回调中记录
+
+    turns = await session_manager.finalize_turn(session_id, user_message, full_response)
+    logger.info(
+        "对话完成: session_id=%s, turns=%s/%s, response_length=%s",
+        session_id, turns, AUTO_ARCHIVE_TURNS, len(full_response)
+    )
+
+
 async def genius_loci_chat_stream(
     user_id: int,
     message: str,
@@ -215,7 +490,7 @@ async def genius_loci_chat_stream(
     gps_latitude: float,
     session_id: Optional[str] = None,
     image_url: Optional[str] = None
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[Any, None]:
     """
     地灵对话流式响应（核心业务逻辑 V2）
 
@@ -245,13 +520,14 @@ async def genius_loci_chat_stream(
         image_url: 图片 URL（首次对话时传入）
 
     Yields:
-        流式文本片段
+        首个产出为 {SESSION_ID_KEY: session_id} 元数据哨兵，之后为流式文本片段
     """
     try:
         # ========================================
         # 1. 会话管理
         # ========================================
 
+        # 会话对象只取一次，后续全程就地读写，不再反复查字典
         is_new_session = False
         if not session_id:
             # 创建新会话
@@ -262,7 +538,8 @@ async def genius_loci_chat_stream(
                 image_url=image_url
             )
             is_new_session = True
-            logger.info(f"新会话创建: session_id={session_id}")
+            session = session_manager.sessions[session_id]
+            logger.info("新会话创建: session_id=%s", session_id)
         else:
             # 获取现有会话
             session = session_manager.get_session(session_id)
@@ -275,10 +552,10 @@ async def genius_loci_chat_stream(
                     image_url=image_url
                 )
                 is_new_session = True
+                session = session_manager.sessions[session_id]
 
-        # 更新会话活跃时间
-        session_manager.update_activity(session_id)
-        session = session_manager.get_session(session_id)
+        # 更新会话活跃时间（会话对象已在手，直接传入）
+        session_manager.update_activity(session_id, session)
 
         # ========================================
         # 渐进式归档检查（每N轮对话自动归档）
@@ -288,65 +565,79 @@ async def genius_loci_chat_stream(
         should_archive = (current_turns > 0 and current_turns % AUTO_ARCHIVE_TURNS == 0)
 
         if should_archive:
-            logger.info(f"🔄 触发渐进式归档: session_id={session_id}, turns={current_turns}")
+            logger.info("🔄 触发渐进式归档: session_id=%s, turns=%s", session_id, current_turns)
 
-            # 归档当前会话
-            await archive_conversation(
-                bubble_id=session.get("bubble_id"),
+            # 归档含一次 LLM 总结调用，放后台执行——不把总结延迟
+            # 算进用户下一条消息的首响应。history 传副本，避免与
+            # 稍后的 clear_session 竞争
+            archive_task = asyncio.create_task(archive_conversation(
+                bubble_id=session.bubble_id,
                 user_id=user_id,
                 session_id=session_id,
-                conversation=session["history"],
-                gps_longitude=session["location"]["longitude"],
-                gps_latitude=session["location"]["latitude"]
-            )
+                conversation=list(session.history),
+                gps_longitude=session.gps_longitude,
+                gps_latitude=session.gps_latitude,
+                summary_so_far=session.summary,
+                prior_turns=session.summary_turns
+            ))
+            session_manager.track_background_task(archive_task)
 
             # 创建新会话（继承上下文）
-            old_bubble_id = session.get("bubble_id")
+            old_bubble_id = session.bubble_id
             old_session_id = session_id
 
             # 注意：新会话不再需要图片，因为已经分析过了
             # 同时保留历史记录的前几轮作为上下文
-            history_context = session["history"][-10:] if len(session["history"]) > 10 else session["history"]
+            history_context = deque(list(session.history)[-10:])
 
+            # 继承上下文在构造时一次写入，不再创建后逐字段回填
             new_session_id = session_manager.create_session(
                 user_id=user_id,
                 gps_longitude=gps_longitude,
                 gps_latitude=gps_latitude,
-                image_url=None
+                image_url=None,
+                history=history_context,
+                bubble_id=old_bubble_id,
+                is_first=False
             )
 
-            # 继承上下文到新会话
-            session_manager.sessions[new_session_id]["history"] = history_context
-            session_manager.sessions[new_session_id]["bubble_id"] = old_bubble_id
-            session_manager.sessions[new_session_id]["is_first"] = False
-            session_manager.sessions[new_session_id]["context_initialized"] = True
-
-            # 切换到新会话
+            # 切换到新会话（session_id 重新绑定，会话对象同步重取）
             session_id = new_session_id
-            session = session_manager.get_session(session_id)
+            session = session_manager.sessions[session_id]
 
             # 清除旧会话
             session_manager.clear_session(old_session_id)
 
             logger.info(f"✓ 渐进式归档完成，已切换到新会话: old={old_session_id[:8]}..., new={new_session_id[:8]}...")
 
+        # 会话 ID 已确定（可能在归档后切换），先产出元数据哨兵
+        yield {SESSION_ID_KEY: session_id}
+
         # ========================================
         # 2. 首次对话逻辑：创建场景气泡 + 构建上下文
         # ========================================
 
         system_context = None  # 初始化上下文变量（用于对话）
+        bubble_task = None  # 首轮气泡创建后台任务（流式结束后收尾）
 
-        if session["is_first"]:
+        if session.is_first:
             logger.info("触发首次对话逻辑：创建场景气泡")
 
-            # 2.0 使用 BubbleNoteService 创建气泡记录（包含情感识别）
+            # 2.0 记忆检索与气泡创建相互独立，先并发派发，
+            # 冷启动耗时从两者之和降为两者较大值
+            logger.info("检索附近记忆，位置: (%s, %s)", gps_longitude, gps_latitude)
+            memory_task = asyncio.create_task(get_nearby_genius_loci_memory(
+                gps_longitude=gps_longitude,
+                gps_latitude=gps_latitude,
+                radius_km=1.0,
+                exclude_user_id=user_id,  # 排除当前用户
+                ai_process_type=AI_PROCESS_TYPE_CHAT_SUMMARY
+            ))
+
+            # 使用 BubbleNoteService 创建气泡记录（包含情感识别）
+            # 服务与模型在模块顶部导入、实例全局复用，
+            # 首聊热路径不再走 import 机制 + 重复构造
             try:
-                from app.services.bubble_service import BubbleNoteService
-                from app.models.schemas import BubbleNoteCreate
-
-                bubble_service = BubbleNoteService()
-
-                print("user_id", user_id)
                 # 构建 BubbleNoteCreate 对象
                 note_data = BubbleNoteCreate(
                     user_id=user_id,
@@ -357,75 +648,89 @@ async def genius_loci_chat_stream(
                     status=1
                 )
 
-                # 调用服务层处理（会自动进行情感识别）
-                result = await bubble_service.create_or_update_note(note_data)
-
-                if result and result.get("note_id"):
-                    bubble_id = result.get("note_id")
-                    session_manager.set_bubble_id(session_id, bubble_id)
-                    emotion = result.get("emotion", "平静")
-                    logger.info(f"✓ 场景气泡记录创建成功: bubble_id={bubble_id}, emotion={emotion}")
-                else:
-                    logger.warning("⚠ 气泡创建返回异常结果")
+                # 调用服务层处理（会自动进行情感识别），全程后台执行：
+                # bubble_id 在落库完成时经回调写回会话，不阻塞开流
+                bubble_task = asyncio.create_task(
+                    bubble_service.create_or_update_note(note_data)
+                )
 
+                def _on_bubble_done(task: asyncio.Task, sid: str = session_id):
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"✗ 场景气泡记录创建失败: {e}")
+                        return
+                    if result and result.get("note_id"):
+                        session_manager.track_background_task(asyncio.create_task(
+                            session_manager.set_bubble_id(sid, result["note_id"])
+                        ))
+                        logger.info(
+                            f"✓ 场景气泡记录创建成功: bubble_id={result['note_id']}, "
+                            f"emotion={result.get('emotion', '平静')}"
+                        )
+                    else:
+                        logger.warning("⚠ 气泡创建返回异常结果")
+
+                bubble_task.add_done_callback(_on_bubble_done)
             except Exception as e:
                 logger.error(f"✗ 场景气泡记录创建失败: {e}")
 
-            # 2.1 视觉层：图片解析（如果有图片）
-            vision_description = None
+            # 2.1 视觉层：图片解析任务（如果有图片），与记忆检索/气泡创建并发
+            vision_task = None
+            # is_first 分支内视觉必然未分析过，无需再查状态位
             if image_url:
-                if not session["vision_analyzed"]:
-                    try:
-                        logger.info(f"开始视觉分析，图片URL: {image_url}")
-                        vision_description = await vision_service.analyze_image(image_url)
-                        session["vision_analyzed"] = True
-
-                        if vision_description:
-                            logger.info(f"✓ 视觉分析完成: {vision_description}")
-                        else:
-                            logger.warning("✗ 视觉分析失败，跳过视觉信息")
-                    except Exception as e:
-                        logger.error(f"✗ 视觉分析异常: {e}")
-
-            # 2.2 记忆层：检索历史记忆
-            memory_result = None
-            try:
-                logger.info(f"检索附近记忆，位置: ({gps_longitude}, {gps_latitude})")
-                memory_result = await get_nearby_genius_loci_memory(
-                    gps_longitude=gps_longitude,
-                    gps_latitude=gps_latitude,
-                    radius_km=1.0,
-                    exclude_user_id=user_id,  # 排除当前用户
-                    ai_process_type=AI_PROCESS_TYPE_CHAT_SUMMARY
+                logger.info("开始视觉分析，图片URL: %s", image_url)
+                vision_task = asyncio.create_task(vision_service.analyze_image_cached(image_url))
+
+            # 2.2 限时汇合：视觉 + 记忆在预算内完成才注入开场上下文，
+            # 超时的任务放行继续跑（仅用于日志），立即开流不再等待
+            prep_tasks = {memory_task}
+            if vision_task is not None:
+                prep_tasks.add(vision_task)
+            done, pending = await asyncio.wait(prep_tasks, timeout=FIRST_TURN_PREP_TIMEOUT)
+            if pending:
+                logger.info(
+                    f"⏱ 首轮上下文准备超时({FIRST_TURN_PREP_TIMEOUT}s)，"
+                    f"{len(pending)} 项未就绪，先行开流"
                 )
+                for task in pending:
+                    # 吞掉迟到任务的异常，避免 "exception was never retrieved" 噪音
+                    task.add_done_callback(lambda t: t.exception())
 
-                if memory_result:
-                    # 解析 JSON 格式的 ai_result
+            vision_description = None
+            if vision_task is not None and vision_task in done:
+                if vision_task.exception() is not None:
+                    logger.error(f"✗ 视觉分析异常: {vision_task.exception()}")
+                elif vision_task.result():
+                    vision_description = vision_task.result()
+                    logger.info("✓ 视觉分析完成: %s", vision_description)
+                else:
+                    logger.warning("✗ 视觉分析失败，跳过视觉信息")
+
+            memory_summary = ""
+            if memory_task in done:
+                if memory_task.exception() is not None:
+                    logger.error(f"✗ 记忆检索异常: {memory_task.exception()}")
+                elif memory_task.result():
+                    memory_result = memory_task.result()
+                    raw_ai_result = memory_result.get("ai_result", "")
+                    # ai_result 只解析一次，后续日志/内容/上下文直接复用结果
                     try:
-                        ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                        memory_summary = ai_result_json.get("summary", memory_result.get("ai_result", ""))
-                        logger.info(f"✓ 检索到历史记忆: {memory_summary[:50]}...")
+                        memory_summary = orjson.loads(raw_ai_result or "{}").get("summary") or raw_ai_result
                     except:
-                        logger.info(f"✓ 检索到历史记忆: {memory_result.get('ai_result', '')[:50]}...")
+                        memory_summary = raw_ai_result
+                    logger.info("✓ 检索到历史记忆: %s...", memory_summary[:50])
                 else:
                     logger.info("✓ 附近无历史记忆，跳过记忆检索")
 
-            except Exception as e:
-                logger.error(f"✗ 记忆检索异常: {e}")
-
             # 2.3 构建场景内容（视觉+记忆+用户输入）
             content_parts = []
             if message:
                 content_parts.append(f"用户输入: {message}")
             if vision_description:
                 content_parts.append(f"\n【场景描述】{vision_description}")
-            if memory_result:
-                try:
-                    ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                    memory_summary = ai_result_json.get("summary", "")
-                    content_parts.append(f"\n【此地记忆】{memory_summary}")
-                except:
-                    content_parts.append(f"\n【此地记忆】{memory_result.get('ai_result', '')}")
+            if memory_summary:
+                content_parts.append(f"\n【此地记忆】{memory_summary}")
 
             # # 即使没有任何额外信息，也要创建气泡（用户至少输入了消息）
             # if not content_parts:
@@ -489,56 +794,101 @@ async def genius_loci_chat_stream(
             # except Exception as e:
             #     logger.error(f"✗ 场景气泡记录创建失败: {e}")
 
-            # 标记首次对话完成
-            session["is_first"] = False
-            session["context_initialized"] = True
+            # 标记首次对话完成（is_first 是唯一的首聊状态位）
+            session.is_first = False
 
             # 2.5 构建系统上下文（用于首次对话的流式响应）
             context_parts = []
             if vision_description:
                 context_parts.append(f"【当前场景】{vision_description}")
-            if memory_result:
-                try:
-                    ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                    memory_summary = ai_result_json.get("summary", memory_result.get("ai_result", ""))
-                    context_parts.append(f"【此地记忆】{memory_summary}")
-                except:
-                    context_parts.append(f"【此地记忆】{memory_result.get('ai_result', '')}")
+            if memory_summary:
+                context_parts.append(f"【此地记忆】{memory_summary}")
 
             if context_parts:
                 system_context = "\n".join(context_parts)
-                logger.info(f"✓ 首次对话上下文构建完成:\n{system_context}")
+                logger.info("✓ 首次对话上下文构建完成:\n%s", system_context)
 
         # ========================================
         # 3. 多轮对话：流式响应
         # ========================================
 
-        logger.info(f"开始流式对话，session_id={session_id}")
+        logger.info("开始流式对话，session_id=%s", session_id)
 
         # 获取会话历史
-        session_history = session["history"]
-
-        # 调用对话服务
-        full_response = ""
-        async for chunk in chat_service.chat_stream(
+        session_history = list(session.history)
+
+        # 调用对话服务（分批转发：积累到字符/时限阈值才向下游 yield
+        # 一次合并片段。__anext__ 包成任务后用 wait 限时等待——超时只
+        # 触发冲刷、任务继续挂着，不用 wait_for：它的超时取消会直接
+        # 打断底层生成器）
+        # 完整回复按片段收集、循环后一次 join：生成器帧持有引用时
+        # CPython 的原地 str 拼接无法就地扩容，长回复下是 O(n²) 拷贝
+        response_parts: List[str] = []
+        buf: List[str] = []
+        buf_len = 0
+        stream_iter = chat_service.chat_stream(
             user_message=message,
             session_history=session_history,
             system_context=system_context
-        ):
-            full_response += chunk
-            yield chunk
+        ).__aiter__()
+        next_task = asyncio.ensure_future(stream_iter.__anext__())
+        last_flush = time.monotonic()
+        exhausted = False
+
+        try:
+            while not exhausted:
+                done, _ = await asyncio.wait({next_task}, timeout=STREAM_FLUSH_INTERVAL)
+                if next_task in done:
+                    try:
+                        chunk = next_task.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    else:
+                        buf.append(chunk)
+                        buf_len += len(chunk)
+                        next_task = asyncio.ensure_future(stream_iter.__anext__())
+
+                now = time.monotonic()
+                if buf and (
+                    exhausted
+                    or buf_len >= STREAM_FLUSH_CHARS
+                    or now - last_flush >= STREAM_FLUSH_INTERVAL
+                ):
+                    merged = "".join(buf)
+                    response_parts.append(merged)
+                    yield merged
+                    buf.clear()
+                    buf_len = 0
+                    last_flush = now
+        finally:
+            # 客户端断连时 CancelledError 从 yield 处抛入：挂起的
+            # __anext__ 任务必须显式取消并关闭底层生成器，否则 LLM
+            # HTTP 流会一直挂到下一个 token 到达，任务的未取结果
+            # 还会报 "exception was never retrieved"
+            if not next_task.done():
+                next_task.cancel()
+                try:
+                    await next_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            elif not next_task.cancelled():
+                next_task.exception()  # 取走异常，压掉未取结果的告警
+            try:
+                await stream_iter.aclose()
+            except Exception:
+                pass
+
+        full_response = "".join(response_parts)
 
         # ========================================
         # 4. 记录对话历史并更新轮数
         # ========================================
 
-        session_manager.add_to_history(session_id, "user", message)
-        session_manager.add_to_history(session_id, "assistant", full_response)
-
-        # 增加对话轮数
-        turns = session_manager.increment_turns(session_id)
-
-        logger.info(f"对话完成: session_id={session_id}, turns={turns}/{AUTO_ARCHIVE_TURNS}, response_length={len(full_response)}")
+        # 会话记账移出请求协程：最后一个片段已送达，生成器立即返回、
+        # 连接随即关闭，历史追加/轮数递增/首轮气泡收尾在后台完成
+        session_manager.track_background_task(asyncio.create_task(
+            _finalize_chat_turn(session_id, message, full_response, bubble_task)
+        ))
 
     except Exception as e:
         logger.error(f"地灵对话异常: {e}")
@@ -555,7 +905,9 @@ async def archive_conversation(
     session_id: str,
     conversation: List[Dict[str, str]],
     gps_longitude: float,
-    gps_latitude: float
+    gps_latitude: float,
+    summary_so_far: str = "",
+    prior_turns: int = 0
 ):
     """
     归档对话总结（手动或超时触发）
@@ -564,12 +916,14 @@ async def archive_conversation(
         bubble_id: 关联的气泡 ID
         user_id: 用户 ID
         session_id: 会话 ID
-        conversation: 对话记录列表
+        conversation: 对话记录列表（滚动摘要启用时只含最近片段）
         gps_longitude: 经度
         gps_latitude: 纬度
+        summary_so_far: 已折叠历史的滚动摘要（可选）
+        prior_turns: 已折叠进摘要的轮数（可选）
     """
     try:
-        if not conversation:
+        if not conversation and not summary_so_far:
             logger.info(f"对话历史为空，跳过归档: session_id={session_id}")
             return
 
@@ -577,42 +931,50 @@ async def archive_conversation(
             logger.warning(f"bubble_id 为空，无法归档: session_id={session_id}")
             return
 
-        logger.info(f"开始归档对话，session_id={session_id}, bubble_id={bubble_id}, 对话轮数: {len(conversation) // 2}")
+        total_turns = prior_turns + len(conversation) // 2
+        logger.info("开始归档对话，session_id=%s, bubble_id=%s, 对话轮数: %s", session_id, bubble_id, total_turns)
+
+        # 调用对话服务总结最近片段（更早的历史已折叠在 summary_so_far 中）
+        summary_text = ""
+        if conversation:
+            summary_text = await chat_service.summarize_conversation(conversation)
 
-        # 调用对话服务进行总结
-        summary_text = await chat_service.summarize_conversation(conversation)
+            if not summary_text:
+                logger.warning("对话总结失败，使用原始对话")
+                summary_text = _build_simple_summary(conversation)
 
-        if not summary_text:
-            logger.warning("对话总结失败，使用原始对话")
-            summary_text = _build_simple_summary(conversation)
+        if summary_so_far:
+            summary_text = f"{summary_so_far}\n{summary_text}" if summary_text else summary_so_far
 
         # 构建 JSON 格式的 ai_result
         ai_result_json = {
             "summary": summary_text,
-            "turns": len(conversation) // 2,
+            "turns": total_turns,
             "session_id": session_id
         }
 
-        # 保存到数据库（使用实际的表结构）
-        record = await create_genius_loci_record(
+        # 提交到归档队列（由后台任务批量落库）
+        row = build_genius_loci_row(
             bubble_id=bubble_id,
             user_id=user_id,
             ai_process_type=AI_PROCESS_TYPE_CHAT_SUMMARY,  # 5-对话总结
-            ai_result=json.dumps(ai_result_json, ensure_ascii=False),
+            ai_result=ai_result_json,  # dict 原样下传，DB 边界统一序列化
             model_version=settings.MODEL_NAME,
             gps_longitude=gps_longitude,
             gps_latitude=gps_latitude
         )
+        await archive_queue.put(row)
 
-        if record:
-            logger.info(f"✓ 对话归档成功: record_id={record['id']}, bubble_id={bubble_id}")
-        else:
-            logger.error("✗ 对话归档失败")
+        logger.info("✓ 对话归档已提交: bubble_id=%s, session_id=%s", bubble_id, session_id)
 
     except Exception as e:
         logger.error(f"归档对话异常: {e}")
 
 
+# 角色显示名查表（_build_simple_summary 用，免去逐条三元判断）
+_ROLE = {"user": "用户", "assistant": "地灵"}
+
+
 def _build_simple_summary(conversation: List[Dict[str, str]]) -> str:
     """
     构建简单的对话摘要（当 AI 总结失败时的备用方案）
@@ -621,14 +983,10 @@ def _build_simple_summary(conversation: List[Dict[str, str]]) -> str:
         conversation: 对话记录
 
     Returns:
-        简单摘要
+        简单摘要（最近3轮）
     """
-    # 只保留最近3轮对话
-    recent_conversation = conversation[-6:] if len(conversation) > 6 else conversation
-
-    summary_parts = []
-    for msg in recent_conversation:
-        role = "用户" if msg["role"] == "user" else "地灵"
-        summary_parts.append(f"{role}说：{msg['content']}")
-
-    return " | ".join(summary_parts)
+    # 切片越界安全，无需先判长度；生成器直接喂 join，单次分配
+    return " | ".join(
+        f"{_ROLE.get(msg['role'], msg['role'])}说：{msg['content']}"
+        for msg in conversation[-6:]
+    )
@@ -6,13 +6,24 @@
 """
 
 import logging
-import httpx
+import time
+from collections import OrderedDict
 from typing import Optional
+
+import httpx
+
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+# 视觉分析结果缓存参数：同一 image_url 的描述在 TTL 内复用
+# （同一地点多会话、用户重试都会带同一 OSS URL），
+# 命中即省掉一次视觉大模型调用——首轮延迟的最大单项
+VISION_CACHE_MAX = 2048  # 缓存条目上限（LRU 淘汰）
+VISION_CACHE_TTL = 3600  # 缓存有效期（秒）
+
+
 class VisionService:
     """视觉感知服务类（单例模式）"""
 
@@ -37,9 +48,43 @@ class VisionService:
         if not self.api_key:
             logger.warning("视觉模型 API Key 未配置，视觉分析功能将不可用")
 
+        # 结果 LRU 缓存 {image_url: (expire_at, description)}：
+        # OrderedDict 按最近使用排序，超限从最旧端弹出
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+
         VisionService._initialized = True
         logger.info("视觉感知服务初始化成功")
 
+    async def analyze_image_cached(self, image_url: str) -> Optional[str]:
+        """
+        分析图片（带 LRU + TTL 结果缓存），语义同 analyze_image
+
+        只缓存成功结果：失败（None）不入缓存，下次调用自然重试。
+
+        Args:
+            image_url: 图片的 URL 地址
+
+        Returns:
+            场景文本描述，失败则返回 None
+        """
+        now = time.monotonic()
+        hit = self._cache.get(image_url)
+        if hit is not None:
+            expire_at, description = hit
+            if now < expire_at:
+                self._cache.move_to_end(image_url)
+                logger.info(f"视觉分析缓存命中: {image_url}")
+                return description
+            # 过期条目：删除后走正常分析
+            del self._cache[image_url]
+
+        description = await self.analyze_image(image_url)
+        if description:
+            self._cache[image_url] = (now + VISION_CACHE_TTL, description)
+            while len(self._cache) > VISION_CACHE_MAX:
+                self._cache.popitem(last=False)
+        return description
+
     async def analyze_image(self, image_url: str) -> Optional[str]:
         """
         分析图片，生成场景文本描述
@@ -5,6 +5,7 @@
 五种情感: 难过、开心、平静、神秘、愤怒
 """
 
+import functools
 import requests
 from typing import Optional, List
 from dataclasses import dataclass
@@ -91,34 +92,34 @@ class EmotionAnalyzer:
 
         Returns:
             模型输出的原始结果
+
+        Raises:
+            调用失败时原样抛出（超时/网络/响应格式错误），
+            兜底情感由最外层入口决定——失败不能和正常结果混同，
+            否则会被结果缓存当成有效值存住
         """
-        try:
-            prompt = self._create_prompt(user_text)
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": settings.TEMPERATURE,
-                "max_tokens": settings.MAX_TOKENS,
-                "top_p": settings.TOP_P
-            }
-
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
-
-        except Exception as e:
-            print(f"API调用出错: {e}")
-            return self.config.default_emotion
+        prompt = self._create_prompt(user_text)
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": settings.TEMPERATURE,
+            "max_tokens": settings.MAX_TOKENS,
+            "top_p": settings.TOP_P
+        }
+
+        response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
+        response.raise_for_status()
+
+        result = response.json()
+        return result["choices"][0]["message"]["content"].strip()
 
     def analyze(self, user_text: str) -> str:
         """
@@ -210,21 +211,40 @@ class EmotionAnalyzer:
 # 全局分析器实例
 _analyzer = None
 
+# 缓存 key 只取前 512 字符：足以区分实际内容，又避免把超长文本整段
+# 驻留在缓存键里
+_CACHE_KEY_MAX_CHARS = 512
+
+
+@functools.lru_cache(maxsize=4096)
+def _analyze_cached(text_key: str) -> str:
+    """按文本前缀缓存的模型调用（重复内容直接命中，跳过一次推理）"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = EmotionAnalyzer()
+    return _analyzer.analyze(text_key)
+
 
 def analyze_emotion(text: str) -> str:
     """
     分析文本的情感（主入口函数）
 
+    相同内容（重复保存、模板化短语）的分析结果带 LRU 缓存，
+    命中时完全省掉一次模型 API 调用。API 故障在缓存层之外兜底：
+    lru_cache 不缓存抛异常的调用，瞬时故障不会把默认情感
+    永久钉在该内容上，下次请求自然重试。
+
     Args:
         text: 待分析的文本
 
     Returns:
-        情感词（难过/开心/平静/神秘/愤怒）
+        情感词（难过/开心/平静/神秘/愤怒），API 故障时返回默认情感
     """
-    global _analyzer
-    if _analyzer is None:
-        _analyzer = EmotionAnalyzer()
-    return _analyzer.analyze(text)
+    try:
+        return _analyze_cached(text[:_CACHE_KEY_MAX_CHARS])
+    except Exception as e:
+        print(f"API调用出错: {e}")
+        return EmotionConfig().default_emotion
 
 
 # 使用示例
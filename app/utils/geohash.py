@@ -0,0 +1,118 @@
+"""
+Geohash 编码工具
+功能：将经纬度编码为 geohash 字符串，并计算相邻单元格，
+用于把地理范围查询转换为前缀索引查询
+"""
+
+from typing import List
+
+# geohash 标准 base32 字符表（去掉了 a/i/l/o）
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# 相邻单元格查找表（按方向区分奇偶位，经典 geohash 邻居算法）
+_NEIGHBOR = {
+    "n": ("p0r21436x8zb9dcf5h7kjnmqesgutwvy", "bc01fg45238967deuvhjyznpkmstqrwx"),
+    "s": ("14365h7k9dcfesgujnmqp0r2twvyx8zb", "238967debc01fg45kmstqrwxuvhjyznp"),
+    "e": ("bc01fg45238967deuvhjyznpkmstqrwx", "p0r21436x8zb9dcf5h7kjnmqesgutwvy"),
+    "w": ("238967debc01fg45kmstqrwxuvhjyznp", "14365h7k9dcfesgujnmqp0r2twvyx8zb"),
+}
+_BORDER = {
+    "n": ("prxz", "bcfguvyz"),
+    "s": ("028b", "0145hjnp"),
+    "e": ("bcfguvyz", "prxz"),
+    "w": ("0145hjnp", "028b"),
+}
+
+
+def encode(latitude: float, longitude: float, precision: int = 7) -> str:
+    """
+    将经纬度编码为 geohash 字符串
+
+    Args:
+        latitude: 纬度 [-90, 90]
+        longitude: 经度 [-180, 180]
+        precision: geohash 长度（7 位约 153m x 153m）
+
+    Returns:
+        geohash 字符串
+    """
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+
+    chars = []
+    bit = 0
+    ch = 0
+    even = True  # 偶数位编码经度，奇数位编码纬度
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_min + lon_max) / 2
+            if longitude >= mid:
+                ch = (ch << 1) | 1
+                lon_min = mid
+            else:
+                ch = ch << 1
+                lon_max = mid
+        else:
+            mid = (lat_min + lat_max) / 2
+            if latitude >= mid:
+                ch = (ch << 1) | 1
+                lat_min = mid
+            else:
+                ch = ch << 1
+                lat_max = mid
+
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[ch])
+            bit = 0
+            ch = 0
+
+    return "".join(chars)
+
+
+def adjacent(geohash: str, direction: str) -> str:
+    """
+    计算指定方向上的相邻 geohash 单元格
+
+    Args:
+        geohash: geohash 字符串
+        direction: 方向 ("n"/"s"/"e"/"w")
+
+    Returns:
+        相邻单元格的 geohash
+    """
+    last = geohash[-1]
+    parent = geohash[:-1]
+    parity = len(geohash) % 2
+
+    # 跨越父级单元格边界时需要递归进位
+    if last in _BORDER[direction][parity] and parent:
+        parent = adjacent(parent, direction)
+
+    return parent + _BASE32[_NEIGHBOR[direction][parity].index(last)]
+
+
+def neighbors(geohash: str) -> List[str]:
+    """
+    计算 geohash 周围 8 个相邻单元格
+
+    Args:
+        geohash: geohash 字符串
+
+    Returns:
+        8 个相邻单元格的 geohash 列表（不含自身）
+    """
+    n = adjacent(geohash, "n")
+    s = adjacent(geohash, "s")
+    return [
+        n,
+        adjacent(n, "e"),
+        adjacent(geohash, "e"),
+        adjacent(s, "e"),
+        s,
+        adjacent(s, "w"),
+        adjacent(geohash, "w"),
+        adjacent(n, "w"),
+    ]
@@ -0,0 +1,12 @@
+-- ========================================
+-- bubble_note.image_urls 迁移: TEXT -> TEXT[]
+-- ========================================
+-- 原列为逗号拼接字符串，每次读取都要 split，URL 含逗号时会错切。
+-- 迁移为原生数组列后，服务端直接读写 List[str]，响应序列化零转换。
+
+ALTER TABLE bubble_note
+    ALTER COLUMN image_urls TYPE TEXT[]
+    USING CASE
+        WHEN image_urls IS NULL OR image_urls = '' THEN NULL
+        ELSE string_to_array(image_urls, ',')
+    END;
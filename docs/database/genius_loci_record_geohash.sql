@@ -0,0 +1,17 @@
+-- ========================================
+-- genius_loci_record 增加 geohash 冗余列
+-- ========================================
+-- 插入时按坐标冗余写入 geohash（精度 7，见 app/core/database.py 的
+-- GEOHASH_PRECISION），附近记忆检索用 geohash LIKE '<前缀>%' 的
+-- 3x3 邻域前缀查询替代 4 个经纬度范围比较。
+-- 注意：应用端已按该列读写，未执行本迁移时插入会被 PostgREST 拒绝。
+
+ALTER TABLE genius_loci_record
+    ADD COLUMN IF NOT EXISTS geohash TEXT;
+
+-- text_pattern_ops 使 LIKE 前缀匹配可走 B-tree 索引
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_geohash
+    ON genius_loci_record (geohash text_pattern_ops);
+
+-- 存量行的 geohash 为 NULL，不会被前缀查询命中；
+-- 如需回填，可在应用侧按 gps_longitude/gps_latitude 批量计算后更新。
@@ -11,5 +11,13 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        # auto 在装了 uvloop 的平台（非 Windows）选用 uvloop，
+        # 配合 httptools 降低长 SSE 会话下的事件循环调度开销
+        loop="auto",
+        http="httptools",
+        # reload 模式下 uvicorn 不支持多 worker
+        workers=1 if settings.DEBUG else settings.WORKERS,
+        timeout_keep_alive=settings.TIMEOUT_KEEP_ALIVE,
+        limit_concurrency=settings.LIMIT_CONCURRENCY,
         log_level="info"
     )